@@ -0,0 +1,350 @@
+"""
+Stand-ins for Discord interactions and the MySQL layer, so slash command
+handlers can be driven directly without a gateway connection or database.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import itertools
+import time
+import discord
+from sharding import userPartition
+
+_interaction_ids = itertools.count(1)
+
+
+class FakeUser:
+    def __init__(self, id: int):
+        self.id = id
+        self.name = f"bench-user-{id}"
+
+
+class FakeMessage:
+    def __init__(self, content=None, embed=None, view=None):
+        self.content = content
+        self.embed = embed
+        self.view = view
+
+    async def edit(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, *, ephemeral: bool = False, thinking: bool = False):
+        self._done = True
+
+    async def send_message(self, content=None, *, embed=None, view=None, **kwargs):
+        self._done = True
+        self._interaction._record(content, embed, view)
+
+    async def edit_message(self, *, content=None, embed=None, view=None, **kwargs):
+        self._done = True
+        self._interaction._record(content, embed, view)
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(
+        self, content=None, *, embed=None, view=None, file=None, wait=False, **kwargs
+    ) -> Optional[FakeMessage]:
+        if file is not None:
+            # Read the attachment so export benchmarks include its cost
+            file.fp.read()
+        message = self._interaction._record(content, embed, view)
+        return message if wait else None
+
+
+class FakeInteraction:
+    """
+    Enough of discord.Interaction for the command handlers in botMain.
+    `first_response` is the perf_counter time of the first message sent after
+    the command started, i.e. what the user waits for.
+    """
+
+    def __init__(self, userID: int, command: Optional[Any] = None):
+        self.id = next(_interaction_ids)
+        self.user = FakeUser(userID)
+        self.command = command
+        self.type = discord.InteractionType.application_command
+        self.created_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.first_response: Optional[float] = None
+        self.messages: List[FakeMessage] = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    def _record(self, content, embed, view) -> FakeMessage:
+        if self.first_response is None:
+            self.first_response = time.perf_counter()
+        message = FakeMessage(content, embed, view)
+        self.messages.append(message)
+        return message
+
+    # Seconds from the command starting to its first message
+    @property
+    def latency(self) -> Optional[float]:
+        if self.first_response is None:
+            return None
+        return self.first_response - self.started
+
+
+class FakeMessenger:
+    """
+    Stands in for DirectMessenger: reports each DM to `onSend` instead of
+    sending it, so background jobs are timed without Discord's pacing.
+    """
+
+    def __init__(self, onSend: Callable[[int, Optional[str]], None]):
+        self.onSend = onSend
+        self.sent = 0
+        self.failed = 0
+
+    async def send(self, discordID: int, content=None, embed=None) -> bool:
+        self.sent += 1
+        self.onSend(discordID, content)
+        return True
+
+
+class FakeDatabase:
+    """
+    In-memory replacements for the databaseFunctions queries the commands,
+    the reminder scheduler and the Canvas poller use. Each call runs on a
+    worker thread after `latency` seconds, like a round trip to a remote
+    MySQL server, and the pool size is kept so waits for a free connection
+    show up too. The real token cache stays in front of the token lookup.
+    """
+
+    def __init__(self, latency: float = 0.002, poolSize: int = 5):
+        self.latency = latency
+        self.queries = 0
+        self.tokens: Dict[int, tuple] = {}
+        self.settings: Dict[int, Dict[str, bool]] = {}
+        self.reminders: Dict[int, Dict] = {}
+        # Watermarks and stored due dates, as naive UTC datetimes
+        self.watermarks: Dict[str, datetime] = {}
+        # Discord ID -> [(domain, classID, className), ...]
+        self.enrollments: Dict[int, List[tuple]] = {}
+        self._reminder_ids = itertools.count(1)
+        self._executor = ThreadPoolExecutor(
+            max_workers=poolSize, thread_name_prefix="fake-db"
+        )
+
+    def addUser(self, discordID: int, token: str, domain: str):
+        self.tokens[discordID] = (token, domain)
+
+    # Adds a reminder directly, without the latency of a query
+    def addReminderRow(
+        self, discordID: int, when: datetime, recurring: Optional[str], content: str
+    ) -> int:
+        reminderID = next(self._reminder_ids)
+        self.reminders[reminderID] = {
+            "reminderID": reminderID,
+            "discordID": discordID,
+            "when": when,
+            "recurring": recurring,
+            "content": content,
+        }
+        return reminderID
+
+    def _work(self, fn: Callable[[], Any]) -> Any:
+        time.sleep(self.latency)
+        self.queries += 1
+        return fn()
+
+    async def _call(self, fn: Callable[[], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._work, fn)
+
+    # Points databaseFunctions at this fake; call once before running commands
+    def install(self):
+        import databaseFunctions
+
+        async def queryCanvasToken(discordID):
+            return await self._call(lambda: self.tokens.get(discordID))
+
+        async def getNotificationSettings(discordID):
+            return await self._call(lambda: dict(self.settings.get(discordID, {})))
+
+        async def changeNotificationSettings(discordID, settings):
+            def work():
+                if discordID in self.tokens:
+                    self.settings.setdefault(discordID, {}).update(settings)
+
+            await self._call(work)
+
+        async def getReminders(discordID):
+            return await self._call(
+                lambda: [
+                    r for r in self.reminders.values() if r["discordID"] == discordID
+                ]
+            )
+
+        async def addReminder(discordID, when, recurring, content):
+            def work():
+                if discordID not in self.tokens:
+                    return None
+                return self.addReminderRow(discordID, when, recurring, content)
+
+            return await self._call(work)
+
+        async def getUpcomingReminders(
+            afterWhen, afterID, before, limit, partition=0, partitions=1
+        ):
+            def work():
+                rows = [
+                    dict(row)
+                    for row in self.reminders.values()
+                    if row["when"] < before
+                    and (row["when"], row["reminderID"]) > (afterWhen, afterID)
+                    and userPartition(row["discordID"], partitions) == partition
+                ]
+                rows.sort(key=lambda row: (row["when"], row["reminderID"]))
+                return rows[:limit]
+
+            return await self._call(work)
+
+        # Both claims only succeed if the reminder is still due at `due`
+        async def rescheduleReminder(reminderID, due, when):
+            def work():
+                row = self.reminders.get(reminderID)
+                if row is None or row["when"] != due:
+                    return False
+                row["when"] = when
+                return True
+
+            return await self._call(work)
+
+        async def deleteReminder(reminderID, due):
+            def work():
+                row = self.reminders.get(reminderID)
+                if row is None or row["when"] != due:
+                    return False
+                del self.reminders[reminderID]
+                return True
+
+            return await self._call(work)
+
+        async def getNotificationSubscribers():
+            def work():
+                subscribers = []
+                for discordID, (token, domain) in self.tokens.items():
+                    settings = self.settings.get(discordID, {})
+                    if not settings.get("enable_notifications", True):
+                        continue
+                    subscribers.append(
+                        {
+                            "discordID": discordID,
+                            "token": token,
+                            "domain": domain,
+                            "grade_postings": settings.get("grade_postings", True),
+                            "due_dates": settings.get("due_dates", True),
+                            "announcement_postings": settings.get(
+                                "announcement_postings", True
+                            ),
+                        }
+                    )
+                return subscribers
+
+            return await self._call(work)
+
+        async def replaceEnrollments(discordIDs, rows):
+            def work():
+                for discordID in discordIDs:
+                    self.enrollments[discordID] = []
+                for discordID, domain, classID, className in rows:
+                    if discordID in self.tokens:
+                        self.enrollments[discordID].append(
+                            (domain, classID, className)
+                        )
+
+            if discordIDs:
+                await self._call(work)
+
+        async def getEnrollments():
+            return await self._call(
+                lambda: [
+                    {
+                        "discordID": discordID,
+                        "domain": domain,
+                        "classID": classID,
+                        "className": className,
+                    }
+                    for discordID, rows in self.enrollments.items()
+                    for domain, classID, className in rows
+                ]
+            )
+
+        async def getWatermarks(keys):
+            return await self._call(
+                lambda: {k: self.watermarks[k] for k in keys if k in self.watermarks}
+            )
+
+        async def setWatermarks(marks):
+            def work():
+                for key, mark in marks.items():
+                    self.watermarks[key] = max(mark, self.watermarks.get(key, mark))
+
+            if marks:
+                await self._call(work)
+
+        async def setDueDates(dues):
+            if dues:
+                await self._call(lambda: self.watermarks.update(dues))
+
+        async def deleteExpiredDueDates(prefix):
+            def work():
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
+                for key in [
+                    k
+                    for k, mark in self.watermarks.items()
+                    if k.startswith(prefix) and mark < now
+                ]:
+                    del self.watermarks[key]
+
+            await self._call(work)
+
+        async def deleteUser(discordID):
+            def work():
+                self.tokens.pop(discordID, None)
+                self.settings.pop(discordID, None)
+                for reminderID in [
+                    r
+                    for r, row in self.reminders.items()
+                    if row["discordID"] == discordID
+                ]:
+                    del self.reminders[reminderID]
+
+            await self._call(work)
+            databaseFunctions.forgetToken(discordID)
+
+        databaseFunctions._queryCanvasToken = queryCanvasToken
+        databaseFunctions.getNotificationSettings = getNotificationSettings
+        databaseFunctions.changeNotificationSettings = changeNotificationSettings
+        databaseFunctions.getReminders = getReminders
+        databaseFunctions.addReminder = addReminder
+        databaseFunctions.deleteUser = deleteUser
+        databaseFunctions.getUpcomingReminders = getUpcomingReminders
+        databaseFunctions.rescheduleReminder = rescheduleReminder
+        databaseFunctions.deleteReminder = deleteReminder
+        databaseFunctions.getNotificationSubscribers = getNotificationSubscribers
+        databaseFunctions.replaceEnrollments = replaceEnrollments
+        databaseFunctions.getEnrollments = getEnrollments
+        databaseFunctions.getWatermarks = getWatermarks
+        databaseFunctions.setWatermarks = setWatermarks
+        databaseFunctions.setDueDates = setDueDates
+        databaseFunctions.deleteExpiredDueDates = deleteExpiredDueDates
+
+    def close(self):
+        self._executor.shutdown(wait=False)
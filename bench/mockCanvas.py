@@ -0,0 +1,295 @@
+"""
+A stand-in for the Canvas REST API, serving the endpoints the bot uses from
+generated data. Course, assignment and announcement counts, page sizes,
+latency and Canvas-style rate limiting are all configurable.
+
+Run on its own with `python mockCanvas.py --port 8900`, or start it in a
+background thread from the benchmark harness with MockCanvas.startInThread().
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from aiohttp import web
+
+
+class MockConfig:
+    def __init__(
+        self,
+        users: int = 50,
+        courses: int = 40,
+        coursesPerUser: int = 6,
+        assignmentsPerCourse: int = 60,
+        announcementsPerCourse: int = 10,
+        maxPageSize: int = 100,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        rateLimitBudget: float = 700,
+        rateLimitRefill: float = 10,
+        requestCost: float = 1,
+        seed: int = 1,
+    ):
+        self.users = users
+        self.courses = courses
+        self.coursesPerUser = coursesPerUser
+        self.assignmentsPerCourse = assignmentsPerCourse
+        self.announcementsPerCourse = announcementsPerCourse
+        self.maxPageSize = maxPageSize
+        # Seconds added to every response, plus up to `jitter` more
+        self.latency = latency
+        self.jitter = jitter
+        # Canvas-style leaky bucket per token; 0 disables throttling
+        self.rateLimitBudget = rateLimitBudget
+        self.rateLimitRefill = rateLimitRefill
+        self.requestCost = requestCost
+        self.seed = seed
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parseIso(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class MockCanvas:
+    """Generated Canvas data and the aiohttp application serving it."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.requests = 0
+        self.throttled = 0
+        self.not_modified = 0
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._generate()
+
+    # Token for bench user `n`, as stored in the fake database
+    @staticmethod
+    def token(n: int) -> str:
+        return f"bench-token-{n}"
+
+    def _generate(self):
+        config = self.config
+        rng = random.Random(config.seed)
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.courses: Dict[int, Dict] = {}
+        self.assignments: Dict[int, List[Dict]] = {}
+        self.announcements: Dict[int, List[Dict]] = {}
+        # Graded submissions per course, shared by every enrolled user
+        self.submissions: Dict[int, List[Dict]] = {}
+        for n in range(config.courses):
+            course_id = 1000 + n
+            self.courses[course_id] = {"id": course_id, "name": f"Course {n:03d}"}
+            course_url = f"https://canvas.test/courses/{course_id}"
+            assignments, submissions = [], []
+            for a in range(config.assignmentsPerCourse):
+                minutes = rng.randint(-30 * 24 * 60, 120 * 24 * 60)
+                due = now + timedelta(minutes=minutes)
+                assignment = {
+                    "id": course_id * 10000 + a,
+                    "name": f"Assignment {a} for course {n}",
+                    "html_url": f"{course_url}/assignments/{a}",
+                    "due_at": _iso(due),
+                    "updated_at": _iso(now - timedelta(days=rng.randint(0, 30))),
+                }
+                assignments.append(assignment)
+                # Work is graded a few days after it was due
+                graded = due + timedelta(hours=rng.randint(1, 96))
+                if graded < now:
+                    submissions.append(
+                        {
+                            "assignment_id": assignment["id"],
+                            "grade": str(rng.randint(50, 100)),
+                            "graded_at": _iso(graded),
+                            "assignment": assignment,
+                        }
+                    )
+            assignments.sort(key=lambda item: item["due_at"])
+            submissions.sort(key=lambda item: item["graded_at"])
+            self.assignments[course_id] = assignments
+            self.submissions[course_id] = submissions
+            self.announcements[course_id] = [
+                {
+                    "id": course_id * 10000 + a,
+                    "title": f"Announcement {a} for course {n}",
+                    "html_url": f"{course_url}/discussion_topics/{a}",
+                    "posted_at": _iso(now - timedelta(hours=rng.randint(1, 20 * 24))),
+                    "context_code": f"course_{course_id}",
+                    "message": "<p>" + "Lorem ipsum dolor sit amet. " * 40 + "</p>",
+                }
+                for a in range(config.announcementsPerCourse)
+            ]
+        course_ids = list(self.courses)
+        self.enrollments: Dict[str, List[int]] = {
+            self.token(u): rng.sample(
+                course_ids, min(config.coursesPerUser, len(course_ids))
+            )
+            for u in range(config.users)
+        }
+
+    # Returns the remaining quota, or None if this request is throttled
+    def _charge(self, token: str) -> Optional[float]:
+        config = self.config
+        if not config.rateLimitBudget:
+            return None
+        now = time.monotonic()
+        used, updated = self._buckets.get(token, (0.0, now))
+        used = max(0.0, used - (now - updated) * config.rateLimitRefill)
+        if used + config.requestCost > config.rateLimitBudget:
+            self._buckets[token] = (used, now)
+            return -1
+        used += config.requestCost
+        self._buckets[token] = (used, now)
+        return config.rateLimitBudget - used
+
+    # Refills every token's rate limit bucket
+    def resetRateLimits(self):
+        self._buckets.clear()
+
+    def _page(self, request: web.Request, items: List) -> web.Response:
+        per_page = min(
+            int(request.query.get("per_page", 10)), self.config.maxPageSize
+        )
+        page = int(request.query.get("page", 1))
+        start = (page - 1) * per_page
+        body = json.dumps(items[start : start + per_page])
+        headers = {}
+        if start + per_page < len(items):
+            query = dict(request.query)
+            query["page"] = str(page + 1)
+            next_url = request.url.with_query(query)
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        etag = '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+        headers["ETag"] = etag
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(text=body, content_type="application/json", headers=headers)
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests += 1
+        config = self.config
+        await asyncio.sleep(config.latency + random.uniform(0, config.jitter))
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if token not in self.enrollments:
+            return web.json_response(
+                {"errors": [{"message": "Invalid token"}]}, status=401
+            )
+        remaining = self._charge(token)
+        if remaining is not None and remaining < 0:
+            self.throttled += 1
+            return web.Response(status=403, text="403 Forbidden (Rate Limit Exceeded)")
+        response = await handler(request)
+        if remaining is not None:
+            response.headers["X-Rate-Limit-Remaining"] = f"{remaining:.1f}"
+        return response
+
+    async def _courses(self, request: web.Request) -> web.Response:
+        token = request.headers["Authorization"].removeprefix("Bearer ")
+        items = [self.courses[cid] for cid in self.enrollments[token]]
+        return self._page(request, items)
+
+    async def _course(self, request: web.Request) -> web.Response:
+        course = self.courses.get(int(request.match_info["course_id"]))
+        if course is None:
+            return web.json_response({}, status=404)
+        return web.json_response(course)
+
+    async def _assignments(self, request: web.Request) -> web.Response:
+        course_id = int(request.match_info["course_id"])
+        items = self.assignments.get(course_id, [])
+        if request.query.get("bucket") == "future":
+            now = _iso(datetime.now(timezone.utc))
+            items = [a for a in items if a["due_at"] >= now]
+        return self._page(request, items)
+
+    async def _announcements(self, request: web.Request) -> web.Response:
+        codes = request.query.getall("context_codes[]", [])
+        start = request.query.get("start_date")
+        end = request.query.get("end_date")
+        start_dt = _parseIso(start) if start else None
+        end_dt = _parseIso(end) if end else None
+        if start_dt and not end_dt:
+            end_dt = start_dt + timedelta(days=28)
+        items = []
+        for code in codes:
+            course_id = int(code.removeprefix("course_"))
+            for ann in self.announcements.get(course_id, []):
+                posted = _parseIso(ann["posted_at"])
+                if (start_dt and posted < start_dt) or (end_dt and posted > end_dt):
+                    continue
+                items.append(ann)
+        items.sort(key=lambda item: item["posted_at"], reverse=True)
+        return self._page(request, items)
+
+    async def _submissions(self, request: web.Request) -> web.Response:
+        items = self.submissions.get(int(request.match_info["course_id"]), [])
+        since = request.query.get("graded_since")
+        if since:
+            since_dt = _parseIso(since)
+            items = [s for s in items if _parseIso(s["graded_at"]) >= since_dt]
+        if "assignment" not in request.query.getall("include[]", []):
+            items = [
+                {k: v for k, v in s.items() if k != "assignment"} for s in items
+            ]
+        return self._page(request, items)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/api/v1/courses", self._courses)
+        app.router.add_get("/api/v1/courses/{course_id}", self._course)
+        app.router.add_get("/api/v1/courses/{course_id}/assignments", self._assignments)
+        app.router.add_get(
+            "/api/v1/courses/{course_id}/students/submissions", self._submissions
+        )
+        app.router.add_get("/api/v1/announcements", self._announcements)
+        return app
+
+    # Serves the mock on its own event loop thread and returns its base URL
+    def startInThread(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        ready = threading.Event()
+        result: Dict[str, str] = {}
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            runner = web.AppRunner(self.app(), access_log=None)
+            loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, host, port)
+            loop.run_until_complete(site.start())
+            bound = runner.addresses[0][1]
+            result["url"] = f"http://{host}:{bound}"
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, name="mock-canvas", daemon=True).start()
+        ready.wait()
+        return result["url"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock Canvas API")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--courses", type=int, default=40)
+    parser.add_argument("--assignments", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+    mock = MockCanvas(
+        MockConfig(
+            courses=args.courses,
+            assignmentsPerCourse=args.assignments,
+            latency=args.latency,
+            maxPageSize=args.page_size,
+        )
+    )
+    print(f"Tokens: {MockCanvas.token(0)} .. {MockCanvas.token(mock.config.users - 1)}")
+    web.run_app(mock.app(), host="127.0.0.1", port=args.port)
@@ -0,0 +1,398 @@
+"""
+Offline benchmarks for the slash command handlers in botMain, the reminder
+scheduler and the Canvas poller.
+
+The commands run against bench/mockCanvas.py and the in-memory database in
+bench/fakes.py, driven by fake interactions, so no Discord bot, Canvas
+instance or MySQL server is needed. Reminder and notification DMs go to a
+fake messenger instead of Discord.
+
+Usage (from the bench directory):
+    python run.py                        run every scenario
+    python run.py calendar_cold --users 200
+    python run.py --save-baseline        store the results as the baseline
+
+Every scenario starts with empty caches and a fresh Canvas rate limit;
+calendar_warm then fills them before it measures. Each scenario reports p50/p99
+latency (until the user sees a first message), throughput and Canvas request
+counts. Results are compared with baseline.json when it exists; a p50 or p99
+slower than the baseline by more than --tolerance and by at least
+--noise-floor seconds is flagged and the exit status is 1.
+
+The database is replaced by in-memory functions (see fakes.py), so SQL, the
+connection pool and its executor are not part of the measurements.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# The stub apiKey shadows any real one so benchmarks never touch real services
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "bot"))
+sys.path.insert(0, os.path.join(BENCH_DIR, "stubs"))
+
+import botMain  # noqa: E402
+import announcementText  # noqa: E402
+import canvasClient  # noqa: E402
+import classListCache  # noqa: E402
+import courseCache  # noqa: E402
+import databaseFunctions  # noqa: E402
+import deadlineIndex  # noqa: E402
+import icalExport  # noqa: E402
+import workerPool  # noqa: E402
+from canvasPoller import CanvasPoller  # noqa: E402
+from fakes import FakeDatabase, FakeInteraction, FakeMessenger  # noqa: E402
+from loopMonitor import LoopLagMonitor  # noqa: E402
+from mockCanvas import MockCanvas, MockConfig  # noqa: E402
+from reminderScheduler import ReminderScheduler  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+# Discord IDs given to bench users, offset so they look like snowflakes
+USER_ID_BASE = 10**17
+# Replies that mean a command failed, e.g. a token lookup that raised
+FAILURE_PREFIXES = ("Error", "Something went wrong", "You are not logged in")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.mock = MockCanvas(
+            MockConfig(
+                users=args.users,
+                courses=args.courses,
+                coursesPerUser=args.courses_per_user,
+                assignmentsPerCourse=args.assignments,
+                maxPageSize=args.page_size,
+                latency=args.canvas_latency,
+                rateLimitBudget=args.rate_limit_budget,
+            )
+        )
+        self.database = FakeDatabase(latency=args.db_latency)
+        self.monitor = LoopLagMonitor(interval=0.01)
+        self.base_url = ""
+
+    def userID(self, n: int) -> int:
+        return USER_ID_BASE + n
+
+    def setUp(self):
+        self.base_url = self.mock.startInThread()
+        for n in range(self.args.users):
+            self.database.addUser(self.userID(n), MockCanvas.token(n), self.base_url)
+        self.database.install()
+
+    # Forgets everything cached in memory and refills the Canvas rate limits,
+    # so the next scenario doesn't depend on the ones before it
+    def clearCaches(self):
+        classListCache.class_list_cache.clear()
+        courseCache.course_cache.clear()
+        deadlineIndex._indexes.clear()
+        announcementText._rendered.clear()
+        icalExport._course_blocks.clear()
+        for n in range(self.args.users):
+            databaseFunctions.forgetToken(self.userID(n))
+        self.mock.resetRateLimits()
+
+    # Runs the jobs with at most `concurrency` at once and summarises them
+    async def _measure(
+        self,
+        name: str,
+        jobs: List[Callable[[], Awaitable[Optional[float]]]],
+        concurrency: int,
+    ) -> Dict:
+        limit = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        errors = 0
+
+        async def run(job):
+            nonlocal errors
+            async with limit:
+                try:
+                    latency = await job()
+                except Exception as e:
+                    print(f"{name}: {e}")
+                    latency = None
+            if latency is None:
+                errors += 1
+            else:
+                latencies.append(latency)
+
+        requests_before = self.mock.requests
+        throttled_before = self.mock.throttled
+        self.monitor.worst = 0.0
+        started = time.perf_counter()
+        await asyncio.gather(*(run(job) for job in jobs))
+        elapsed = time.perf_counter() - started
+        return {
+            "count": len(jobs),
+            "errors": errors,
+            "p50": round(percentile(latencies, 0.50), 4),
+            "p99": round(percentile(latencies, 0.99), 4),
+            "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "canvas_requests": self.mock.requests - requests_before,
+            "canvas_throttled": self.mock.throttled - throttled_before,
+            "worst_loop_lag": round(self.monitor.worst, 4),
+        }
+
+    # Runs a command handler and returns the time to its first message
+    async def _command(self, callback, userID: int, *args) -> Optional[float]:
+        interaction = FakeInteraction(userID)
+        await callback(interaction, *args)
+        failed = any(
+            (m.content or "").startswith(FAILURE_PREFIXES)
+            for m in interaction.messages
+        )
+        return None if failed else interaction.latency
+
+    def _calendarJobs(self):
+        end_date = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+        return [
+            lambda n=n: self._command(
+                botMain.calendar.callback, self.userID(n), end_date, None
+            )
+            for n in range(self.args.users)
+        ]
+
+    async def calendar_cold(self) -> Dict:
+        return await self._measure(
+            "calendar_cold", self._calendarJobs(), self.args.concurrency
+        )
+
+    async def calendar_warm(self) -> Dict:
+        # Make sure every index exists, then measure answering from memory
+        await self._measure("warmup", self._calendarJobs(), self.args.concurrency)
+        result = await self._measure(
+            "calendar_warm", self._calendarJobs(), self.args.concurrency
+        )
+        result["caches"] = "warm"
+        return result
+
+    async def announcements(self) -> Dict:
+        async def job(n: int) -> Optional[float]:
+            token = MockCanvas.token(n)
+            course_id = self.mock.enrollments[token][0]
+            name = self.mock.courses[course_id]["name"]
+            return await self._command(
+                botMain.announcements.callback, self.userID(n), name
+            )
+
+        jobs = [lambda n=n: job(n) for n in range(self.args.users)]
+        return await self._measure("announcements", jobs, self.args.concurrency)
+
+    async def autocomplete(self) -> Dict:
+        # Every user types a class name one character at a time
+        word = "Course 0"
+        interval = self.args.keystroke_interval
+
+        async def keystroke(n: int, typed: str, delay: float) -> Optional[float]:
+            await asyncio.sleep(delay)
+            interaction = FakeInteraction(self.userID(n))
+            started = time.perf_counter()
+            await botMain.class_name_autocomplete(interaction, typed)
+            return time.perf_counter() - started
+
+        jobs = [
+            lambda n=n, i=i: keystroke(n, word[: i + 1], i * interval)
+            for n in range(self.args.users)
+            for i in range(len(word))
+        ]
+        return await self._measure("autocomplete", jobs, len(jobs))
+
+    async def reminders(self) -> Dict:
+        when = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M")
+        jobs = [
+            lambda n=n, i=i: self._command(
+                botMain.reminder.callback,
+                self.userID(n),
+                when,
+                None,
+                f"Bench reminder {i}",
+            )
+            for n in range(self.args.users)
+            for i in range(self.args.reminders_per_user)
+        ]
+        return await self._measure("reminders", jobs, self.args.concurrency * 4)
+
+    async def reminder_dispatch(self) -> Dict:
+        # Reminders fall due over --dispatch-spread seconds and are sent by the
+        # real scheduler; latency is from each reminder's time to its DM
+        loop = asyncio.get_running_loop()
+        count = self.args.users * self.args.reminders_per_user
+        spread = self.args.dispatch_spread
+        start = datetime.now() + timedelta(seconds=1)
+        pending: Dict[str, Tuple[datetime, asyncio.Future]] = {}
+        for i in range(count):
+            when = start + timedelta(seconds=spread * i / count)
+            # Every fourth reminder recurs, so it is rescheduled instead of deleted
+            recurring = "daily" if i % 4 == 0 else None
+            content = f"Dispatch {i}"
+            self.database.addReminderRow(
+                self.userID(i % self.args.users), when, recurring, content
+            )
+            pending[f"⏰ Reminder: {content}"] = (when, loop.create_future())
+
+        def onSend(discordID: int, content: Optional[str]):
+            when, sent = pending[content]
+            sent.set_result((datetime.now() - when).total_seconds())
+
+        async def job(sent: asyncio.Future) -> float:
+            return await asyncio.wait_for(sent, spread + 30)
+
+        scheduler = ReminderScheduler(FakeMessenger(onSend))
+        scheduler.start()
+        try:
+            jobs = [lambda sent=sent: job(sent) for _, sent in pending.values()]
+            return await self._measure("reminder_dispatch", jobs, len(jobs))
+        finally:
+            await scheduler.stop()
+
+    async def poll(self) -> Dict:
+        # Each cycle starts from the same watermarks, --poll-lookback hours
+        # old, so every cycle finds the same announcements, due date changes
+        # and grades
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(
+            hours=self.args.poll_lookback
+        )
+        marks = {}
+        for n in range(self.args.users):
+            for course_id in self.mock.enrollments[MockCanvas.token(n)]:
+                base = f"{self.base_url}|{course_id}"
+                marks[f"{base}|announcements"] = since
+                marks[f"{base}|assignments"] = since
+                marks[f"{base}|grades|{self.userID(n)}"] = since
+        poller = CanvasPoller()
+        events = 0
+
+        async def cycle() -> float:
+            nonlocal events
+            self.database.watermarks = dict(marks)
+            poller._due_dates.clear()
+            started = time.perf_counter()
+            await poller.pollOnce()
+            elapsed = time.perf_counter() - started
+            while not poller._queue.empty():
+                events += len(poller._queue.get_nowait().targets)
+            return elapsed
+
+        jobs = [cycle for _ in range(self.args.poll_cycles)]
+        result = await self._measure("poll", jobs, 1)
+        result["notifications"] = events // max(self.args.poll_cycles, 1)
+        return result
+
+    async def run(self, names: List[str]) -> Dict[str, Dict]:
+        self.setUp()
+        self.monitor.start()
+        results = {}
+        try:
+            for name in names:
+                self.clearCaches()
+                result = await getattr(self, name)()
+                # Cache state when measuring started
+                result.setdefault("caches", "cold")
+                results[name] = result
+                print(f"{name:18} {json.dumps(results[name])}")
+        finally:
+            await self.monitor.stop()
+            await canvasClient.closeSessions()
+            workerPool.shutdown()
+            self.database.close()
+        return results
+
+
+SCENARIOS = [
+    "calendar_cold",
+    "calendar_warm",
+    "announcements",
+    "autocomplete",
+    "reminders",
+    "reminder_dispatch",
+    "poll",
+]
+
+
+# Prints how each scenario moved against the baseline; returns True if slower.
+# A change counts only past `tolerance` and `floor` seconds, as sub-millisecond
+# latencies move by large fractions between identical runs.
+def compare(
+    results: Dict[str, Dict],
+    baseline: Dict[str, Dict],
+    tolerance: float,
+    floor: float,
+):
+    regressed = False
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for key in ("p50", "p99"):
+            if not before.get(key):
+                continue
+            change = result[key] / before[key] - 1
+            flag = ""
+            if change > tolerance and result[key] - before[key] >= floor:
+                flag = "  REGRESSION"
+                regressed = True
+            print(
+                f"{name:18} {key} {before[key]:.4f}s -> {result[key]:.4f}s "
+                f"({change:+.0%}){flag}"
+            )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks")
+    parser.add_argument("scenarios", nargs="*", help=", ".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--courses", type=int, default=40)
+    parser.add_argument("--courses-per-user", type=int, default=6)
+    parser.add_argument("--assignments", type=int, default=60)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--canvas-latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit-budget", type=float, default=700)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--keystroke-interval", type=float, default=0.05)
+    parser.add_argument("--reminders-per-user", type=int, default=10)
+    parser.add_argument("--dispatch-spread", type=float, default=5)
+    parser.add_argument("--poll-cycles", type=int, default=5)
+    parser.add_argument("--poll-lookback", type=float, default=72)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--noise-floor",
+        type=float,
+        default=0.005,
+        help="seconds a latency must grow by to count as a regression",
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    results = asyncio.run(Bench(args).run(args.scenarios or SCENARIOS))
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {BASELINE_PATH}")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            if compare(results, json.load(f), args.tolerance, args.noise_floor):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# Placeholder settings so the bot modules import during benchmarks.
+# Nothing here connects anywhere: Discord is never contacted and the
+# database layer is replaced by bench/fakes.py.
+botToken = "bench"
+domainURL = "localhost"
+ownerGuild = 0
+databaseHost = "127.0.0.1"
+databaseUser = "bench"
+databasePassword = "bench"
+databaseName = "CanvasCord"
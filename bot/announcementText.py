@@ -0,0 +1,126 @@
+from html.parser import HTMLParser
+from typing import Dict, List, Tuple
+import re
+import workerPool
+from ttlCache import TTLCache
+
+# Longest text kept per announcement, Discord's limit for an embed field value
+MAX_TEXT_LENGTH = 1024
+# Characters of HTML handed to the parser at a time, parsing stops once full
+FEED_CHUNK = 2048
+
+# Tags whose contents are never shown
+_HIDDEN_TAGS = {"script", "style", "head", "title"}
+# Tags that start a new line in the rendered text
+_BLOCK_TAGS = set(
+    "address blockquote br div h1 h2 h3 h4 h5 h6 hr li ol p pre section table tr ul"
+    .split()
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Rendered text keyed by (announcement id, updated_at), shared by every user
+# since an edit changes updated_at and so the key
+_rendered = TTLCache(maxsize=4096, ttl=24 * 60 * 60)
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Collects the visible text of an HTML fragment with whitespace collapsed
+    and one line per block element. Stops collecting once `limit` characters
+    are stored, and reports that through `full` so the caller stops feeding.
+    """
+
+    def __init__(self, limit: int):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.full = False
+        self._parts: List[str] = []
+        self._length = 0
+        self._hidden = 0
+        self._newline = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _HIDDEN_TAGS:
+            self._hidden += 1
+        elif tag in _BLOCK_TAGS:
+            self._breakLine()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self._breakLine()
+
+    def handle_endtag(self, tag):
+        if tag in _HIDDEN_TAGS:
+            self._hidden = max(self._hidden - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self._breakLine()
+
+    def handle_data(self, data):
+        if self._hidden or self.full:
+            return
+        text = _WHITESPACE.sub(" ", data)
+        if self._newline:
+            text = text.lstrip()
+        if text:
+            self._append(text)
+            self._newline = False
+
+    def _breakLine(self):
+        if not self._newline and not self.full:
+            self._append("\n")
+            self._newline = True
+
+    def _append(self, text: str):
+        room = self.limit - self._length
+        if room <= 0:
+            self.full = True
+            return
+        if len(text) > room:
+            # Leave space for the ellipsis
+            text = text[: room - 1].rstrip() + "…"
+        self._parts.append(text)
+        self._length += len(text)
+        if self._length >= self.limit:
+            self.full = True
+
+    def text(self) -> str:
+        return "".join(self._parts).strip()
+
+
+# Converts an announcement's HTML body to plain text of at most `limit` characters
+def renderHTML(html: str, limit: int = MAX_TEXT_LENGTH) -> str:
+    parser = _TextExtractor(limit)
+    for start in range(0, len(html), FEED_CHUNK):
+        parser.feed(html[start : start + FEED_CHUNK])
+        if parser.full:
+            break
+    else:
+        parser.close()
+    return parser.text()
+
+
+# Renders long bodies in the worker stage so the event loop isn't held up
+async def _render(html: str) -> str:
+    if len(html) < workerPool.INLINE_BYTES:
+        return renderHTML(html)
+    return await workerPool.run(renderHTML, html)
+
+
+# Rendered text cache (hits, misses), for the metrics endpoint
+def cacheStats() -> Tuple[int, int]:
+    return _rendered.stats()
+
+
+# Returns the rendered text of a Canvas announcement, parsing each version once
+async def announcementText(announcement: Dict) -> str:
+    html = announcement.get("message") or ""
+    version = announcement.get("updated_at") or announcement.get("posted_at")
+    if announcement.get("id") is None or not version:
+        return await _render(html)
+    key = (announcement["id"], version)
+    text = _rendered.get(key)
+    if text is None:
+        text = await _render(html)
+        _rendered.set(key, text)
+    return text
@@ -1,10 +1,35 @@
-from datetime import datetime
-from typing import Optional, List
+import time
+
+# Taken before the other imports so the reported time-to-ready includes them
+STARTED_AT = time.perf_counter()
+
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Coroutine, Dict, Optional, List, Sequence, Set
+import asyncio
+import math
 import discord
 from discord import app_commands
+import announcementText
 import apiKey
-import canvasFunctions
+import canvasClient
+import classListCache
+import commandSync
+import courseCache
 import databaseFunctions
+import deadlineIndex
+import icalExport
+import metrics
+import sharding
+import workerPool
+from cacheBus import CacheBus
+from cacheWarmup import ActivityLog, CacheWarmer
+from canvasPoller import CanvasPoller
+from classListCache import getClassListCached
+from deadlineIndex import DeadlineRefresher
+from directMessages import DirectMessenger
+from loopMonitor import LoopLagMonitor
+from persistentCache import MySQLResponseStore
+from reminderScheduler import ReminderScheduler
 
 
 async def ensure_logged_in(interaction: discord.Interaction) -> Optional[str]:
@@ -36,13 +61,15 @@ async def class_name_autocomplete(
         if not token_data:
             return []
         canvas_token, canvas_domain = token_data
-        classes = await canvasFunctions.getClassList(canvas_token, canvas_domain)
+        classes = await getClassListCached(
+            interaction.user.id, canvas_token, canvas_domain
+        )
 
         # Filter classes based on what user is typing (`current`)
         matches = [
-            app_commands.Choice(name=name, value=name)
-            for name, _ in classes
-            if current.lower() in name.lower()
+            app_commands.Choice(name=course.name, value=course.name)
+            for course in classes
+            if current.lower() in course.name.lower()
         ][
             :25
         ]  # Max 25 results
@@ -50,35 +77,357 @@ async def class_name_autocomplete(
 
     except Exception:
         return []  # Return empty if anything fails
+    finally:
+        metrics.finishCommand(interaction.id)
+
+
+# Results shown per embed page, and Discord's limit on an embed description
+PAGE_ITEMS = 10
+EMBED_DESCRIPTION_LIMIT = 4096
+# Seconds the page buttons keep working after the last click
+PAGE_TIMEOUT = 600
+# Characters of each announcement's text shown by /announcements, so a page of
+# five fits in one embed
+ANNOUNCEMENT_PREVIEW = 600
+# Seconds between database health checks, reported as canvascord_db_healthy
+DB_HEALTH_INTERVAL = 60
+
+
+class PagedView(discord.ui.View):
+    """
+    Previous/next buttons over a result set that was already fetched.
+    Pages are rendered only when first shown and kept for later clicks, so
+    the first page goes out without formatting the rest.
+    """
+
+    def __init__(
+        self,
+        owner_id: int,
+        title: str,
+        items: Sequence,
+        render: Callable[[Sequence], str],
+        per_page: int = PAGE_ITEMS,
+        decorate: Optional[Callable[[discord.Embed], None]] = None,
+    ):
+        super().__init__(timeout=PAGE_TIMEOUT)
+        self.owner_id = owner_id
+        self.title = title
+        self.items = items
+        self.render = render
+        self.per_page = per_page
+        self.decorate = decorate
+        self.page_count = max(1, math.ceil(len(items) / per_page))
+        self.current = 0
+        self.message: Optional[discord.Message] = None
+        self._pages: Dict[int, discord.Embed] = {}
+        self._updateButtons()
+
+    def page(self, number: int) -> discord.Embed:
+        embed = self._pages.get(number)
+        if embed is None:
+            start = number * self.per_page
+            description = self.render(self.items[start : start + self.per_page])
+            if len(description) > EMBED_DESCRIPTION_LIMIT:
+                description = description[: EMBED_DESCRIPTION_LIMIT - 1] + "…"
+            embed = discord.Embed(title=self.title, description=description)
+            if self.page_count > 1:
+                embed.set_footer(text=f"Page {number + 1} of {self.page_count}")
+            if self.decorate is not None:
+                self.decorate(embed)
+            self._pages[number] = embed
+        return embed
+
+    def _updateButtons(self):
+        self.previous_page.disabled = self.current == 0
+        self.next_page.disabled = self.current >= self.page_count - 1
+
+    async def _show(self, interaction: discord.Interaction, number: int):
+        self.current = number
+        self._updateButtons()
+        await interaction.response.edit_message(embed=self.page(number), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        await self._show(interaction, max(self.current - 1, 0))
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        await self._show(interaction, min(self.current + 1, self.page_count - 1))
+
+    # Only the user who ran the command can turn its pages
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    async def on_timeout(self):
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+
+# Shortens an announcement's rendered text for a list entry
+def preview(text: str, limit: int = ANNOUNCEMENT_PREVIEW) -> str:
+    if len(text) <= limit:
+        return text
+    return text[: limit - 1].rstrip() + "…"
+
+
+# Sends a result set as embed pages, with buttons if there is more than one
+async def send_paged(
+    interaction: discord.Interaction,
+    title: str,
+    items: Sequence,
+    render: Callable[[Sequence], str],
+    per_page: int = PAGE_ITEMS,
+    decorate: Optional[Callable[[discord.Embed], None]] = None,
+    ephemeral: bool = True,
+):
+    view = PagedView(interaction.user.id, title, items, render, per_page, decorate)
+    with metrics.phase("discord_send"):
+        if view.page_count == 1:
+            await interaction.followup.send(embed=view.page(0), ephemeral=ephemeral)
+            view.stop()
+            return
+        view.message = await interaction.followup.send(
+            embed=view.page(0), view=view, ephemeral=ephemeral, wait=True
+        )
 
 
-class MyClient(discord.Client):
-    def __init__(self, *, intents: discord.Intents):
-        super().__init__(intents=intents)
+class CommandTree(app_commands.CommandTree):
+    # Runs before every command and autocomplete, in the task that serves it,
+    # so timings recorded further down are attributed to the command
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        command = interaction.command
+        name = command.qualified_name if command is not None else "unknown"
+        if interaction.type is discord.InteractionType.autocomplete:
+            name += ":autocomplete"
+        else:
+            # Keystrokes would drown out commands in the activity ranking
+            self.client.activity_log.record(interaction.user.id)
+        metrics.beginCommand(interaction.id, name, interaction.created_at.timestamp())
+        return True
+
+
+class MyClient(discord.AutoShardedClient):
+    def __init__(self, *, intents: discord.Intents, shard: sharding.ShardConfig):
+        # Without a shard range Discord's recommended shard count is used and
+        # every shard runs in this process
+        super().__init__(
+            intents=intents, shard_ids=shard.shardIDs, shard_count=shard.shardCount
+        )
+        self.shard = shard
         # This allows all commands to be available in all context.
-        self.tree = app_commands.CommandTree(
+        self.tree = CommandTree(
             self,
             allowed_contexts=app_commands.AppCommandContext(
                 guild=True, dm_channel=True, private_channel=True
             ),
         )
+        self.messenger = DirectMessenger(self)
+        self.reminders = ReminderScheduler(self.messenger, shard=shard)
+        self.poller = CanvasPoller(shard=shard)
+        # Tells the other bot processes to drop cached user data
+        self.bus = CacheBus(shard.busPort, shard.busPeers) if shard.busPort else None
+        self.deadlines = DeadlineRefresher()
+        # Ranks users by use, so their caches are preloaded after a restart
+        self.activity_log = ActivityLog(shard.workerIndex)
+        self.warmer = CacheWarmer(shard)
+        # Tasks started with spawn(), held so they aren't garbage collected
+        self.background_tasks: Set[asyncio.Task] = set()
+        self.fanout_task = None
+        self.database_task = None
+        self.sync_task = None
+        self.loop_monitor = LoopLagMonitor()
+        self.metrics_runner = None
+        self.ready_seconds: Optional[float] = None
 
     # This part runs when the bot first connects
     async def setup_hook(self):
+        # Revalidate Canvas pages against copies kept in MySQL
+        canvasClient.setResponseStore(MySQLResponseStore())
+        # Measure how long the event loop is blocked while commands run
+        self.loop_monitor.start()
+        self.register_metrics()
+        try:
+            # Each process of a sharded deployment serves on its own port
+            self.metrics_runner = await metrics.startServer(
+                port=metrics.METRICS_PORT + self.shard.workerIndex
+            )
+        except OSError as e:
+            print(f"Error starting metrics endpoint: {e}")
+        if self.bus is not None:
+            try:
+                await self.bus.start()
+                self.bus.subscribe("user", self.forget_user)
+                self.bus.subscribe("reminders", lambda _: self.reminders.reload())
+            except OSError as e:
+                print(f"Error starting cache bus: {e}")
+        # Start dispatching reminders and Canvas notifications in the background
+        databaseFunctions.onRemindersAdded(self.reminders_added)
+        self.reminders.start()
+        self.poller.start()
+        self.deadlines.start()
+        self.activity_log.start()
+        self.fanout_task = self.spawn(self.notificationFanout(), "notification fanout")
+        # Connecting to the gateway doesn't wait for the pool or command sync
+        self.database_task = self.spawn(self.watch_database(), "database watch")
+        # The command tree is global, one process syncs it for the deployment
+        if self.shard.primary:
+            self.sync_task = self.spawn(self.sync_commands(), "command sync")
+
+    # Runs `coro` in the background, keeping a reference until it finishes and
+    # reporting it if it fails
+    def spawn(self, coro: Coroutine, name: str) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+
+        def done(task: asyncio.Task):
+            self.background_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                print(f"Error in {name}: {task.exception()}")
+
+        task.add_done_callback(done)
+        return task
+
+    # Opens the database pool, then keeps checking that the database answers
+    async def watch_database(self):
+        await databaseFunctions.warmUp()
+        while True:
+            await asyncio.sleep(DB_HEALTH_INTERVAL)
+            await databaseFunctions.healthCheck()
+
+    # Syncs the command tree globally and to the owner's guild, skipping each
+    # sync whose definitions match the last one made
+    async def sync_commands(self):
         try:
             # Sync the commands to discord, this can take up to one hour.
-            synced = await self.tree.sync()
-            print(f"Synced {len(synced)} commands.")
+            synced = await commandSync.syncIfChanged(self.tree)
+            if synced is None:
+                print("Global commands unchanged, skipped sync.")
+            else:
+                print(f"Synced {synced} commands.")
             # Copy all global commands then sync the commands to our test server, this takes at most a few minutes.
-            self.tree.copy_global_to(guild=discord.Object(apiKey.ownerGuild))
-            syncedGuild = await self.tree.sync(guild=discord.Object(apiKey.ownerGuild))
-            print(f"Synced {len(syncedGuild)} commands to guild.")
+            guild = discord.Object(apiKey.ownerGuild)
+            self.tree.copy_global_to(guild=guild)
+            syncedGuild = await commandSync.syncIfChanged(self.tree, guild)
+            if syncedGuild is not None:
+                print(f"Synced {syncedGuild} commands to guild.")
         except Exception as e:
-            print(f"Error syncing commands in setup_hook: {e}")
+            print(f"Error syncing commands: {e}")
+
+    # Exposes cache, pool and event loop state alongside the latency metrics
+    def register_metrics(self):
+        metrics.registerCache("class_list", classListCache.class_list_cache.stats)
+        metrics.registerCache("course", courseCache.course_cache.stats)
+        metrics.registerCache("token", databaseFunctions.tokenCacheStats)
+        metrics.registerCache("deadline_index", deadlineIndex.cacheStats)
+        metrics.registerCache("announcement_text", announcementText.cacheStats)
+        metrics.gauge(
+            "canvascord_db_healthy",
+            "1 if the last database health check succeeded",
+            lambda: databaseFunctions.poolStats()["healthy"],
+        )
+        for stat in ("in_use", "waiting", "reconnects", "errors"):
+            metrics.gauge(
+                f"canvascord_db_pool_{stat}",
+                f"Database pool {stat.replace('_', ' ')}",
+                lambda stat=stat: databaseFunctions.poolStats()[stat],
+            )
+        metrics.gauge(
+            "canvascord_ready_seconds",
+            "Seconds from process start to the first READY",
+            lambda: self.ready_seconds,
+        )
+        metrics.gauge(
+            "canvascord_warmup_users_total",
+            "Users selected for cache preloading",
+            lambda: self.warmer.total,
+        )
+        metrics.gauge(
+            "canvascord_warmup_users_done",
+            "Users whose caches were preloaded",
+            lambda: self.warmer.done,
+        )
+        metrics.gauge(
+            "canvascord_warmup_users_failed",
+            "Users whose preload failed",
+            lambda: self.warmer.failed,
+        )
+        metrics.gauge(
+            "canvascord_warmup_canvas_requests",
+            "Canvas requests charged to the warmup budget",
+            lambda: self.warmer.spent,
+        )
+        metrics.gauge(
+            "canvascord_warmup_running",
+            "1 while the cache warmup runs",
+            lambda: self.warmer.running,
+        )
+        metrics.gauge(
+            "canvascord_loop_lag_worst_seconds",
+            "Longest event loop stall since startup",
+            lambda: self.loop_monitor.worst,
+        )
+        metrics.gauge(
+            "canvascord_worker_dispatches",
+            "Batches sent to the parsing worker pool",
+            lambda: workerPool.getStage().dispatches,
+        )
+
+    # Loads bulk-inserted reminders here and on the other bot processes
+    def reminders_added(self):
+        self.reminders.reload()
+        if self.bus is not None:
+            self.bus.publish("reminders", 0)
+
+    # Drops everything this process holds in memory for a user
+    def forget_user(self, discordID: int):
+        databaseFunctions.forgetToken(discordID)
+        classListCache.invalidateUser(discordID)
+        deadlineIndex.dropUser(discordID)
+        self.reminders.cancelUser(discordID)
+
+    # Sends each detected Canvas change to the users subscribed to it
+    async def notificationFanout(self):
+        async for event in self.poller.changes():
+            embed = discord.Embed(
+                title=event.title, url=event.url or None, description=event.detail
+            )
+            embed.set_author(name=event.className)
+            for discord_id in event.targets:
+                self.spawn(
+                    self.messenger.send(discord_id, embed=embed), "notification DM"
+                )
+
+    # Release pooled Canvas and database connections before the bot disconnects
+    async def close(self):
+        await self.reminders.stop()
+        await self.poller.stop()
+        await self.deadlines.stop()
+        self.warmer.cancel()
+        await self.activity_log.stop()
+        # Also stops the fanout, database watch, command sync and pending DMs
+        for task in list(self.background_tasks):
+            task.cancel()
+        await self.loop_monitor.stop()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        metrics.closeLog()
+        if self.bus is not None:
+            self.bus.close()
+        await canvasClient.closeSessions()
+        await super().close()
+        workerPool.shutdown()
+        databaseFunctions.closePool()
 
 
 intents = discord.Intents.default()
-client = MyClient(intents=intents)
+client = MyClient(intents=intents, shard=sharding.fromEnvironment())
 
 
 # /notification_settings command - sets new notification settings in the database
@@ -160,13 +509,12 @@ async def announcements(interaction: discord.Interaction, class_name: str):
             return
         canvas_token, canvas_domain = token_data
 
-        class_list = await canvasFunctions.getClassList(canvas_token, canvas_domain)
+        class_list = await getClassListCached(
+            interaction.user.id, canvas_token, canvas_domain
+        )
 
-        matched = [
-            cid for name, cid in class_list if class_name.lower() in name.lower()
-        ]
         # Enforce strict match using autocomplete names
-        matched_names = [name for name, _ in class_list]
+        matched_names = [course.name for course in class_list]
         if class_name not in matched_names:
             await interaction.followup.send(
                 "Invalid class name. Please use the suggested autocomplete options.",
@@ -175,7 +523,7 @@ async def announcements(interaction: discord.Interaction, class_name: str):
             return
 
         # Proceed with matching class ID
-        matched = [cid for name, cid in class_list if name == class_name]
+        matched = [course.id for course in class_list if course.name == class_name]
         if not matched:
             await interaction.followup.send(
                 "Something went wrong matching that class name.", ephemeral=True
@@ -184,8 +532,8 @@ async def announcements(interaction: discord.Interaction, class_name: str):
 
         # Return if no announcements found for class
         class_id = matched[0]
-        announcements = await canvasFunctions.getAnnouncements(
-            canvas_token, class_id, canvas_domain
+        announcements = await courseCache.getAnnouncements(
+            interaction.user.id, canvas_token, canvas_domain, class_id
         )
         if not announcements:
             await interaction.followup.send(
@@ -193,11 +541,16 @@ async def announcements(interaction: discord.Interaction, class_name: str):
             )
             return
 
-        # Gather all the announcements and then send them in the message
-        content = "\n\n".join(
-            f"**{a['title']}**\n<{a['url']}>" for a in announcements[:5]
+        # Every announcement is available, a page at a time
+        await send_paged(
+            interaction,
+            f"Announcements in {class_name}",
+            announcements,
+            lambda page: "\n\n".join(
+                f"**{a.title}**\n<{a.url}>\n{preview(a.message)}" for a in page
+            ),
+            per_page=5,
         )
-        await interaction.followup.send(content, ephemeral=True)
 
     except Exception as e:
         await interaction.followup.send(f"Error: {e}", ephemeral=True)
@@ -205,8 +558,8 @@ async def announcements(interaction: discord.Interaction, class_name: str):
 
 # /calendar command - retrieves upcoming assignments from Canvas
 # Accepts a future end date (max 90 days ahead) and an optional class name
-# Gathers assignments from all classes or a specific class
-# Filters by due date and formats results by class
+# Answers from the user's deadline index, a range query over due dates that
+# is kept up to date in the background, and formats results by class
 @client.tree.command(
     name="calendar",
     description="Get assignments between now and a future date (max 90 days)",
@@ -223,8 +576,8 @@ async def calendar(
 
     try:
         # Validate the date format and range
-        now = datetime.now()
-        end = datetime.strptime(end_date, "%Y-%m-%d")
+        now = datetime.now(timezone.utc)
+        end = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
 
         if (end - now).days > 90 or (end - now).days < 0:
             await interaction.followup.send(
@@ -232,51 +585,69 @@ async def calendar(
             )
             return
 
+        # Include assignments due at any time on the end date
+        end += timedelta(days=1)
+
         # Retrieve user's Canvas token and optionally filter by class name
         token_data = await ensure_logged_in(interaction)
         if not token_data:
             return
         canvas_token, canvas_domain = token_data
-        assignments = []
 
+        classes = await getClassListCached(
+            interaction.user.id, canvas_token, canvas_domain
+        )
         if class_name:
-            classes = await canvasFunctions.getClassList(canvas_token, canvas_domain)
-            matched = [
-                cid for name, cid in classes if class_name.lower() in name.lower()
-            ]
-            if not matched:
+            classes = [
+                course
+                for course in classes
+                if class_name.lower() in course.name.lower()
+            ][:1]
+            if not classes:
                 await interaction.followup.send("Class not found.", ephemeral=True)
                 return
-            assignments = await canvasFunctions.getAssignments(
-                canvas_token, matched[0], class_name, canvas_domain
-            )
-        else:
-            classes = await canvasFunctions.getClassList(canvas_token, canvas_domain)
-            for _, cid in classes:
-                assignments += await canvasFunctions.getAssignments(
-                    canvas_token, cid, "", canvas_domain
-                )
 
-        # Aggregate and filter assignments by due date
-        filtered = [a for a in assignments if now <= a["due_date"] <= end]
-        grouped = {}
-        for a in filtered:
-            grouped.setdefault(a["class"], []).append(
-                f"- {a['title']} (due {a['due_date'].strftime('%b %d')})"
-            )
+        # Built from the shared course cache on first use, then refreshed in
+        # the background
+        index = await deadlineIndex.getIndex(
+            interaction.user.id, canvas_token, canvas_domain
+        )
+        filtered = index.range(
+            int(now.timestamp()),
+            int(end.timestamp()),
+            classes[0].id if class_name else None,
+        )
+        updated = index.refreshedAt
+        freshness = f"\n\n-# Updated <t:{int(updated)}:R>" if updated else ""
 
-        if not grouped:
+        if not filtered:
             await interaction.followup.send(
-                "No assignments found in that time range.", ephemeral=True
+                "No assignments found in that time range." + freshness, ephemeral=True
             )
             return
 
-        # Group results and format message per class
-        msg = ""
-        for cls, items in grouped.items():
-            msg += f"\n**{cls}**\n" + "\n".join(items) + "\n"
+        # Group each page's results by class
+        def render(page) -> str:
+            grouped = {}
+            for a in page:
+                grouped.setdefault(a.course_name, []).append(
+                    f"- {a.title} (due {a.due_date.strftime('%b %d')})"
+                )
+            return "\n\n".join(
+                f"**{cls}**\n" + "\n".join(items) for cls, items in grouped.items()
+            )
 
-        await interaction.followup.send(msg.strip(), ephemeral=True)
+        def show_freshness(embed: discord.Embed):
+            if updated:
+                embed.add_field(name="Updated", value=f"<t:{int(updated)}:R>")
+
+        await send_paged(
+            interaction,
+            f"Assignments due by {end_date}",
+            filtered,
+            render,
+            decorate=show_freshness,
+        )
 
     except ValueError:
         await interaction.followup.send(
@@ -286,6 +657,50 @@ async def calendar(
         await interaction.followup.send(f"Error: {e}", ephemeral=True)
 
 
+# /export_calendar command - sends upcoming assignments as an .ics file
+# The file is streamed course by course, so it works for any number of classes
+@client.tree.command(
+    name="export_calendar",
+    description="Download your assignments for the next 90 days as a calendar file",
+)
+@app_commands.describe(class_name="Optional class name")
+@app_commands.autocomplete(class_name=class_name_autocomplete)
+async def export_calendar(
+    interaction: discord.Interaction, class_name: Optional[str] = None
+):
+    await interaction.response.defer(ephemeral=True)
+
+    try:
+        token_data = await ensure_logged_in(interaction)
+        if not token_data:
+            return
+        canvas_token, canvas_domain = token_data
+
+        classes = await getClassListCached(
+            interaction.user.id, canvas_token, canvas_domain
+        )
+        if class_name:
+            classes = [course for course in classes if course.name == class_name]
+            if not classes:
+                await interaction.followup.send("Class not found.", ephemeral=True)
+                return
+
+        output, _ = await icalExport.exportCalendar(
+            interaction.user.id, canvas_token, canvas_domain, classes
+        )
+        with output, metrics.phase("discord_send"):
+            await interaction.followup.send(
+                "Import this file into Google Calendar, Outlook or Apple Calendar.",
+                file=discord.File(output, filename="canvas-assignments.ics"),
+                ephemeral=True,
+            )
+
+    except Exception as e:
+        await interaction.followup.send(
+            f"Error exporting calendar: {e}", ephemeral=True
+        )
+
+
 # /reminder command - creates a new reminder with optional recurrence
 # Accepts a future datetime, a message, and optional daily/weekly repeat
 # Saves reminder to the database and confirms setup
@@ -325,9 +740,17 @@ async def reminder(
 
         # Save reminder details in the database
         recurrence_value = recurring.value if recurring else None
-        await databaseFunctions.addReminder(
+        reminder_id = await databaseFunctions.addReminder(
             interaction.user.id, remind_time, recurrence_value, content
         )
+        if reminder_id is not None:
+            client.reminders.schedule(
+                reminder_id,
+                interaction.user.id,
+                remind_time,
+                recurrence_value,
+                content,
+            )
 
         # Format and send confirmation message
         note = f" and will repeat {recurrence_value}" if recurrence_value else ""
@@ -354,12 +777,20 @@ async def classlist(interaction: discord.Interaction):
         if not token_data:
             return
         canvas_token, canvas_domain = token_data
-        classes = await canvasFunctions.getClassList(canvas_token, canvas_domain)
+        classes = await getClassListCached(
+            interaction.user.id, canvas_token, canvas_domain
+        )
         if not classes:
             await interaction.followup.send("No classes found.")
             return
-        msg = "\n".join([f"• {name}" for name, _ in classes])
-        await interaction.followup.send(f"Here are your current classes:\n{msg}")
+        await send_paged(
+            interaction,
+            "Here are your current classes",
+            classes,
+            lambda page: "\n".join(f"• {course.name}" for course in page),
+            per_page=20,
+            ephemeral=False,
+        )
     except Exception as e:
         await interaction.followup.send(f"Error fetching class list: {e}")
 
@@ -381,6 +812,9 @@ async def logout(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
     try:
         await databaseFunctions.deleteUser(interaction.user.id)
+        client.forget_user(interaction.user.id)
+        if client.bus is not None:
+            client.bus.publish("user", interaction.user.id)
         await interaction.followup.send("Your data has been deleted.", ephemeral=True)
     except Exception as e:
         await interaction.followup.send(f"Error during logout: {e}", ephemeral=True)
@@ -391,8 +825,29 @@ async def logout(interaction: discord.Interaction):
 @client.event
 async def on_ready():
     print(f"Logged in as {client.user} (ID: {client.user.id})")
+    print(f"Running {client.shard.describe()}")
+    # on_ready fires again after reconnects, only the first one is startup
+    if client.ready_seconds is None:
+        client.ready_seconds = time.perf_counter() - STARTED_AT
+        print(f"Ready in {client.ready_seconds:.2f}s")
+        # Preload the most active users' caches in the background
+        client.warmer.start()
     print("------")
 
 
+# Event - triggered after a slash command finishes without raising
+# Reports how long the event loop was blocked while the command ran
+@client.event
+async def on_app_command_completion(
+    interaction: discord.Interaction, command: app_commands.Command
+):
+    client.loop_monitor.recordCommand(
+        command.qualified_name, interaction.created_at.timestamp()
+    )
+    metrics.finishCommand(interaction.id)
+
+
 # Starts the Discord bot using the provided bot token
-client.run(apiKey.botToken)
+# Guarded so the benchmarks in bench/ can import the command handlers
+if __name__ == "__main__":
+    client.run(apiKey.botToken)
@@ -0,0 +1,71 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import json
+
+# Handlers receive the Discord ID the message is about
+Handler = Callable[[int], None]
+
+
+class CacheBus(asyncio.DatagramProtocol):
+    """
+    Best-effort invalidation messages between the bot processes of a sharded
+    deployment, sent as small UDP datagrams to every peer. The database stays
+    the source of truth: a lost message only means a peer serves a cached
+    value until its TTL runs out, so nothing is acknowledged or retried.
+    Messages only ever evict, which is why they aren't authenticated; keep
+    the bus on loopback or a private interface.
+    """
+
+    def __init__(
+        self, port: int, peers: Sequence[Tuple[str, int]], host: str = "127.0.0.1"
+    ):
+        self.host = host
+        self.port = port
+        self.peers = list(peers)
+        self.sent = 0
+        self.received = 0
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(
+            lambda: self, local_addr=(self.host, self.port)
+        )
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def subscribe(self, kind: str, handler: Handler):
+        self._handlers.setdefault(kind, []).append(handler)
+
+    # Tells every peer to drop what it has cached of `kind` for a user
+    def publish(self, kind: str, discordID: int):
+        if self._transport is None:
+            return
+        message = json.dumps({"kind": kind, "id": discordID}).encode()
+        for peer in self.peers:
+            self._transport.sendto(message, peer)
+            self.sent += 1
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            message = json.loads(data)
+            kind, discordID = message["kind"], int(message["id"])
+        except (ValueError, KeyError, TypeError):
+            print(f"Ignoring malformed cache bus message from {addr}")
+            return
+        self.received += 1
+        for handler in self._handlers.get(kind, []):
+            try:
+                handler(discordID)
+            except Exception as e:
+                print(f"Error handling cache bus message {kind}: {e}")
+
+    def error_received(self, exc: Exception):
+        print(f"Cache bus error: {exc}")
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+import asyncio
+import time
+import databaseFunctions
+import deadlineIndex
+from canvasScheduler import backgroundPriority
+from classListCache import getClassListCached
+from sharding import ShardConfig
+
+# Seconds between writes of the in-memory activity counts to MySQL
+ACTIVITY_FLUSH_INTERVAL = 60
+# Users preloaded after a restart, most active first
+WARMUP_USERS = 200
+# Only users active within this window are preloaded
+WARMUP_LOOKBACK = timedelta(days=14)
+# Users preloaded at the same time
+WARMUP_CONCURRENCY = 4
+# Canvas requests the warmup may spend, counted as one class list plus one
+# assignment list per course; course cache hits make the real cost lower.
+# Each user's share is reserved before their requests start, so the budget
+# is never overshot.
+WARMUP_CANVAS_BUDGET = 2000
+
+
+class ActivityLog:
+    """
+    Counts commands per user in memory and adds them to the persisted
+    activity scores once a minute, so ranking users costs no extra query per
+    command.
+    """
+
+    def __init__(self, workerIndex: int = 0):
+        self.workerIndex = workerIndex
+        self._pending: Dict[int, Tuple[int, datetime]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, discordID: int):
+        commands, _ = self._pending.get(discordID, (0, None))
+        now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        self._pending[discordID] = (commands + 1, now)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        try:
+            await databaseFunctions.recordActivity(pending, self.workerIndex)
+        except Exception as e:
+            print(f"Error saving user activity: {e}")
+            # Keep the counts for the next flush
+            for discordID, (commands, seen) in pending.items():
+                newer, last = self._pending.get(discordID, (0, seen))
+                self._pending[discordID] = (commands + newer, max(seen, last))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(ACTIVITY_FLUSH_INTERVAL)
+            await self.flush()
+
+
+class CacheWarmer:
+    """
+    Preloads tokens, course lists and deadline indexes for the most active
+    users after a restart, so their first /calendar or autocomplete is
+    answered from memory. Runs once, in the background at Canvas background
+    priority, and stops early when its Canvas budget is spent or cancel() is
+    called. Progress is kept in the counters below for the metrics endpoint.
+    """
+
+    def __init__(self, shard: Optional[ShardConfig] = None):
+        self.shard = shard or ShardConfig()
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.spent = 0
+        self.seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # Starts the warmup; later calls (e.g. on_ready after a reconnect) do nothing
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        if self.running:
+            self._task.cancel()
+
+    async def _run(self):
+        started = time.perf_counter()
+        try:
+            with backgroundPriority():
+                await self._warm()
+        except asyncio.CancelledError:
+            print(f"Cache warmup cancelled after {self.done}/{self.total} users")
+            raise
+        except Exception as e:
+            print(f"Error warming caches: {e}")
+        finally:
+            self.seconds = time.perf_counter() - started
+        print(
+            f"Cache warmup preloaded {self.done}/{self.total} users "
+            f"in {self.seconds:.1f}s ({self.failed} failed)"
+        )
+
+    async def _warm(self):
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - WARMUP_LOOKBACK
+        users = await databaseFunctions.getActiveUsers(
+            since, WARMUP_USERS, self.shard.workerIndex
+        )
+        self.total = len(users)
+        limit = asyncio.Semaphore(WARMUP_CONCURRENCY)
+
+        # Charges `cost` requests to the budget if they fit
+        def reserve(cost: int) -> bool:
+            if self.spent + cost > WARMUP_CANVAS_BUDGET:
+                return False
+            self.spent += cost
+            return True
+
+        async def warmUser(user: Dict):
+            async with limit:
+                # Users still queued once the budget is spent are skipped
+                if not reserve(1):
+                    return
+                discordID, token, domain = (
+                    int(user["discordID"]),
+                    user["token"],
+                    user["domain"],
+                )
+                databaseFunctions.primeToken(discordID, token, domain)
+                try:
+                    classes = await getClassListCached(discordID, token, domain)
+                    # The index reuses the cached class list, so only its
+                    # assignment lists are left to pay for
+                    if not reserve(len(classes)):
+                        return
+                    await deadlineIndex.getIndex(discordID, token, domain)
+                except Exception:
+                    self.failed += 1
+                    return
+                self.done += 1
+
+        await asyncio.gather(*(warmUser(user) for user in users))
@@ -0,0 +1,429 @@
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+import asyncio
+import hashlib
+import json
+import time
+import aiohttp
+import metrics
+import workerPool
+from canvasScheduler import (
+    AdaptiveLimiter,
+    TokenBucket,
+    backoffDelay,
+    currentPriority,
+    rateLimitRemaining,
+)
+from ttlCache import TTLCache
+
+# Connection settings shared by every Canvas session
+MAX_CONNECTIONS_PER_DOMAIN = 20
+KEEPALIVE_SECONDS = 30
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=20, connect=5, sock_read=15)
+
+# Maximum number of in-flight requests for a single Canvas token
+MAX_CONCURRENT_PER_TOKEN = 4
+
+# Request rates (per second) and burst sizes
+TOKEN_RATE, TOKEN_BURST = 10, 20
+DOMAIN_RATE, DOMAIN_BURST = 50, 100
+
+# Concurrency backs off once Canvas' remaining quota drops below this
+LOW_REMAINING = 200
+MAX_RETRIES = 4
+
+# Canvas caps per_page at 100 for most endpoints
+PAGE_SIZE = 100
+
+# One long-lived pooled session per Canvas base URL
+_sessions: Dict[str, aiohttp.ClientSession] = {}
+_sessions_lock = asyncio.Lock()
+
+# Rate-limit state per token and per domain, dropped after being idle a while
+_token_states = TTLCache(maxsize=4096, ttl=900)
+_domain_buckets: Dict[str, TokenBucket] = {}
+
+# Optional persistent store used to revalidate pages with ETag/Last-Modified
+_response_store = None
+_pending_saves: Set[asyncio.Task] = set()
+
+Params = Union[Dict[str, Any], List[Tuple[str, Any]], None]
+# Applied to a decoded page in the worker stage, must be a module-level function
+Transform = Optional[Callable[[Any], Any]]
+
+
+class CanvasError(Exception):
+    """Raised when a Canvas request does not return 200 OK."""
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f"Canvas returned {status} for {url}")
+        self.status = status
+        self.url = url
+
+
+class RateLimited(CanvasError):
+    """Raised when Canvas keeps throttling a request after every retry."""
+
+    def __init__(self, url: str):
+        super().__init__(403, url)
+        self.args = ("Canvas is rate limiting requests, please try again shortly.",)
+
+
+class CanvasResponse:
+    """
+    The parts of a Canvas HTTP response the bot cares about.
+    `data` is the decoded JSON body, or None if the request failed.
+    `next_url` is the rel="next" entry of the Link header, if any.
+    `raw` is the undecoded body, kept so it can be stored for revalidation.
+    """
+
+    __slots__ = ("status", "headers", "data", "next_url", "raw")
+
+    def __init__(
+        self,
+        status: int,
+        headers,
+        data: Any,
+        next_url: Optional[str] = None,
+        raw: Optional[bytes] = None,
+    ):
+        self.status = status
+        self.headers = headers
+        self.data = data
+        self.next_url = next_url
+        self.raw = raw
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200
+
+
+class StoredResponse:
+    """A previously fetched page along with the validators Canvas sent for it."""
+
+    __slots__ = ("etag", "last_modified", "body", "next_url")
+
+    def __init__(
+        self,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        body: str,
+        next_url: Optional[str],
+    ):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.next_url = next_url
+
+
+# aiohttp only accepts str/int/float query values, Canvas expects "true"/"false"
+def _encodeParams(params: Params) -> List[Tuple[str, str]]:
+    if not params:
+        return []
+    items = params.items() if isinstance(params, dict) else params
+    encoded = []
+    for key, value in items:
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        encoded.append((key, str(value)))
+    return encoded
+
+
+def _decodeBody(raw: Union[bytes, str], transform: Transform) -> Any:
+    data = json.loads(raw)
+    return transform(data) if transform is not None else data
+
+
+# Decodes a JSON body, off the event loop unless it is small
+async def _decode(raw: Union[bytes, str], transform: Transform = None) -> Any:
+    with metrics.phase("parse"):
+        if len(raw) < workerPool.INLINE_BYTES:
+            return _decodeBody(raw, transform)
+        return await workerPool.run(_decodeBody, raw, transform)
+
+
+class _TokenState:
+    __slots__ = ("limiter", "bucket")
+
+    def __init__(self):
+        self.limiter = AdaptiveLimiter(MAX_CONCURRENT_PER_TOKEN)
+        self.bucket = TokenBucket(TOKEN_RATE, TOKEN_BURST)
+
+
+# Returns the concurrency limiter and token bucket for one Canvas token
+def _tokenState(canvasToken: str) -> _TokenState:
+    state = _token_states.get(canvasToken)
+    if state is None:
+        state = _TokenState()
+    # Every use restarts the TTL, so only idle states are dropped and a busy
+    # token keeps its AIMD limit and backoff
+    _token_states.set(canvasToken, state)
+    return state
+
+
+def _domainBucket(CANVAS_BASE_URL: str) -> TokenBucket:
+    bucket = _domain_buckets.get(CANVAS_BASE_URL)
+    if bucket is None:
+        bucket = _domain_buckets[CANVAS_BASE_URL] = TokenBucket(
+            DOMAIN_RATE, DOMAIN_BURST
+        )
+    return bucket
+
+
+# Cache scope for data that differs per user, without exposing the token
+def tokenScope(canvasToken: str) -> str:
+    return "user:" + hashlib.sha256(canvasToken.encode()).hexdigest()[:32]
+
+
+# Cache scope for course data that is the same for every enrolled user
+SHARED_SCOPE = "course"
+
+
+# Installs the persistent store used for conditional requests
+def setResponseStore(store):
+    """
+    `store` must provide `async load(key) -> Optional[StoredResponse]` and
+    `async save(key, StoredResponse)`. Requests made with a cacheKey then send
+    If-None-Match/If-Modified-Since and reuse the stored body on 304.
+    """
+    global _response_store
+    _response_store = store
+
+
+def _saveInBackground(key: str, stored: StoredResponse):
+    async def save():
+        try:
+            await _response_store.save(key, stored)
+        except Exception as e:
+            print(f"Error saving Canvas response: {e}")
+
+    task = asyncio.create_task(save())
+    _pending_saves.add(task)
+    task.add_done_callback(_pending_saves.discard)
+
+
+# Returns the shared session for a Canvas domain, creating it on first use
+async def getSession(CANVAS_BASE_URL: str) -> aiohttp.ClientSession:
+    session = _sessions.get(CANVAS_BASE_URL)
+    if session is not None and not session.closed:
+        return session
+
+    async with _sessions_lock:
+        session = _sessions.get(CANVAS_BASE_URL)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS_PER_DOMAIN,
+                keepalive_timeout=KEEPALIVE_SECONDS,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=REQUEST_TIMEOUT,
+                raise_for_status=False,
+            )
+            _sessions[CANVAS_BASE_URL] = session
+        return session
+
+
+# Sends one GET and returns the response plus whether Canvas throttled it
+# The body of a 200 response is left undecoded in `raw`
+async def _send(
+    session: aiohttp.ClientSession, url: str, headers: Dict[str, str], params
+) -> Tuple[CanvasResponse, bool]:
+    async with session.get(url, headers=headers, params=params) as response:
+        if response.status != 200:
+            throttled = response.status == 429
+            if response.status == 403:
+                throttled = "Rate Limit Exceeded" in await response.text()
+            return CanvasResponse(response.status, response.headers, None), throttled
+        raw = await response.read()
+        next_link = response.links.get("next")
+        next_url = str(next_link["url"]) if next_link else None
+        # The body is decoded by the caller, off the event loop
+        return CanvasResponse(200, response.headers, None, next_url, raw), False
+
+
+# Performs a GET against the Canvas API and decodes the JSON body
+async def get(
+    canvasToken: str,
+    CANVAS_BASE_URL: str,
+    path: str,
+    params: Params = None,
+    cacheKey: Optional[str] = None,
+    transform: Transform = None,
+) -> CanvasResponse:
+    """
+    GET `path` (e.g. "/api/v1/courses") on the given Canvas domain.
+    `path` may also be an absolute URL, as returned in Canvas Link headers.
+    With a `cacheKey` and a response store installed, the request is made
+    conditional on the stored copy and a 304 reuses its body.
+    The body is decoded in the worker stage, where `transform` (if given) is
+    also applied to the decoded JSON.
+    Requests pass through per-domain and per-token rate buckets and a
+    per-token adaptive concurrency limit, with interactive requests ahead of
+    background ones. Throttled, 5xx and network failures are retried with
+    jittered backoff; RateLimited is raised if Canvas keeps throttling.
+    """
+    session = await getSession(CANVAS_BASE_URL)
+    url = path if path.startswith("http") else f"{CANVAS_BASE_URL}{path}"
+    headers = {"Authorization": f"Bearer {canvasToken}"}
+    params = _encodeParams(params)
+    priority = currentPriority()
+    state = _tokenState(canvasToken)
+    domain_bucket = _domainBucket(CANVAS_BASE_URL)
+    endpoint = metrics.endpointLabel(url)
+
+    stored = None
+    if cacheKey is not None and _response_store is not None:
+        try:
+            stored = await _response_store.load(cacheKey)
+        except Exception as e:
+            print(f"Error loading stored Canvas response: {e}")
+        if stored is not None:
+            if stored.etag:
+                headers["If-None-Match"] = stored.etag
+            if stored.last_modified:
+                headers["If-Modified-Since"] = stored.last_modified
+
+    for attempt in range(MAX_RETRIES + 1):
+        await domain_bucket.take(priority)
+        await state.bucket.take(priority)
+        try:
+            async with state.limiter:
+                started = time.perf_counter()
+                with metrics.phase("canvas_http"):
+                    response, throttled = await _send(session, url, headers, params)
+                metrics.canvas_request_seconds.observe(
+                    time.perf_counter() - started, endpoint, str(response.status)
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == MAX_RETRIES:
+                raise
+            await asyncio.sleep(backoffDelay(attempt))
+            continue
+
+        # AIMD: back off when Canvas is close to throttling, grow otherwise
+        remaining = rateLimitRemaining(response.headers)
+        if throttled or (remaining is not None and remaining < LOW_REMAINING):
+            state.limiter.decrease()
+        else:
+            state.limiter.increase()
+
+        if throttled:
+            state.bucket.drain()
+            if attempt == MAX_RETRIES:
+                raise RateLimited(url)
+        elif response.status == 304 and stored is not None:
+            # Unchanged since it was stored, no body was sent
+            data = await _decode(stored.body, transform)
+            return CanvasResponse(200, response.headers, data, stored.next_url)
+        elif response.status < 500 or attempt == MAX_RETRIES:
+            if response.ok and cacheKey is not None and _response_store is not None:
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if etag or last_modified:
+                    _saveInBackground(
+                        cacheKey,
+                        StoredResponse(
+                            etag,
+                            last_modified,
+                            response.raw.decode("utf-8"),
+                            response.next_url,
+                        ),
+                    )
+            if response.ok:
+                response.data = await _decode(response.raw, transform)
+            return response
+
+        retry_after = response.headers.get("Retry-After")
+        delay = backoffDelay(attempt)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        await asyncio.sleep(delay)
+
+
+# Streams every item of a paginated Canvas collection
+async def paginate(
+    canvasToken: str,
+    CANVAS_BASE_URL: str,
+    path: str,
+    params: Params = None,
+    cacheScope: Optional[str] = None,
+    transform: Transform = None,
+) -> AsyncIterator[Any]:
+    """
+    Yield items from `path` page by page, following Link rel="next" headers.
+    The next page is requested while the current one is being consumed, and
+    nothing past the current page is held in memory. Consumers that stop
+    early should wrap the iterator in contextlib.aclosing() so the pending
+    prefetch is cancelled straight away.
+    Pass `cacheScope` to revalidate each page against the persistent store;
+    use a per-user scope for personalized data.
+    `transform` maps each decoded page to the list of items to yield, and
+    runs in the worker stage along with JSON decoding.
+    Raises CanvasError if any page does not return 200 OK.
+    """
+    params = _encodeParams(params)
+    if not any(key == "per_page" for key, _ in params):
+        params.append(("per_page", str(PAGE_SIZE)))
+
+    def pageKey(page_url: str, page_params) -> Optional[str]:
+        if cacheScope is None:
+            return None
+        return f"{cacheScope}|{CANVAS_BASE_URL}|{page_url}|{page_params}"
+
+    url = path
+    pending = asyncio.ensure_future(
+        get(
+            canvasToken,
+            CANVAS_BASE_URL,
+            url,
+            params,
+            pageKey(url, params),
+            transform,
+        )
+    )
+    try:
+        while pending is not None:
+            response = await pending
+            pending = None
+            if not response.ok:
+                raise CanvasError(response.status, url)
+
+            # Start fetching the next page before handing out this one
+            if response.next_url:
+                url = response.next_url
+                pending = asyncio.ensure_future(
+                    get(
+                        canvasToken,
+                        CANVAS_BASE_URL,
+                        url,
+                        cacheKey=pageKey(url, None),
+                        transform=transform,
+                    )
+                )
+
+            for item in response.data:
+                yield item
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+# Closes every pooled session, called when the bot shuts down
+async def closeSessions():
+    async with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        if not session.closed:
+            await session.close()
@@ -1,139 +1,95 @@
-from bs4 import BeautifulSoup
-import requests
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Tuple, Any
-import os
+from typing import List, Dict, Tuple, Any, Optional
+from contextlib import aclosing
+from functools import partial
+import asyncio
+import canvasClient
+import canvasRecords
+from announcementText import announcementText
+from canvasRecords import Announcement, Assignment, Course
 
+# Formats a UTC datetime the way Canvas expects in query parameters
+def _canvasTime(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-# Get list of canvas classes then return as names and ids
-async def getClassList(CANVAS_TOKEN: str, CANVAS_BASE_URL) -> list[tuple[str, int]]:
+
+# Parses a Canvas ISO 8601 timestamp into a timezone-aware datetime
+def parseCanvasTime(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+# Get list of canvas classes as Course records
+async def getClassList(CANVAS_TOKEN: str, CANVAS_BASE_URL) -> List[Course]:
     """
     Get a list of active courses for the user in the current term.
-    Returns a list of tuples with (course_name, course_id)
+    Courses without a name (access restricted) are left out.
     """
-    headers = {"Authorization": f"Bearer {CANVAS_TOKEN}"}
-
     try:
-        response = requests.get(
-            f"{CANVAS_BASE_URL}/api/v1/courses",
-            headers=headers,
-            params={
-                "enrollment_state": "active",
-                "state[]": "available",
-                "current_only": True,
-            },
+        courses = canvasClient.paginate(
+            CANVAS_TOKEN,
+            CANVAS_BASE_URL,
+            "/api/v1/courses",
+            params=[
+                ("enrollment_state", "active"),
+                ("state[]", "available"),
+                ("current_only", True),
+            ],
+            cacheScope=canvasClient.tokenScope(CANVAS_TOKEN),
+            transform=canvasRecords.coursePage,
         )
-
-        if response.status_code == 200:
-            courses = response.json()
-            # Filter out courses without a name (access restricted)
-            course_list = [
-                (course["name"], course["id"]) for course in courses if "name" in course
-            ]
-            return course_list
-        else:
-            print(f"Error fetching courses: {response.status_code}")
-            return []
+        return [course async for course in courses]
+    except canvasClient.RateLimited:
+        raise
+    except canvasClient.CanvasError as e:
+        print(f"Error fetching courses: {e.status}")
+        return []
     except Exception as e:
         print(f"Exception in getClassList: {e}")
         return []
 
 
-async def getRecentAnnouncementsAllClasses(
-    CANVAS_TOKEN: str, CANVAS_BASE_URL
-) -> List[Dict[str, str]]:
-    now = datetime.now(tz=timezone.utc)
-    start_date = (now - timedelta(days=14)).isoformat()
-    headers = {"Authorization": f"Bearer {CANVAS_TOKEN}"}
-
-    announcements_all = []
-
-    # Get the list of active classes
-    class_list = await getClassList(CANVAS_TOKEN)
-
-    for class_name, class_id in class_list:
-        try:
-            response = requests.get(
-                f"{CANVAS_BASE_URL}/api/v1/courses/{class_id}/discussion_topics",
-                headers=headers,
-                params={"only_announcements": True, "start_date": start_date},
-            )
-
-            if response.status_code == 200:
-                announcements = response.json()
-                for ann in announcements:
-                    posted_at = ann.get("posted_at", "")
-                    if posted_at:
-                        posted_date = datetime.fromisoformat(
-                            posted_at.replace("Z", "+00:00")
-                        )
-                        if posted_date >= now - timedelta(days=14):
-                            soup = BeautifulSoup(ann.get("message", ""), "html.parser")
-                            announcements_all.append(
-                                {
-                                    "class": class_name,
-                                    "title": ann.get("title", "No Title"),
-                                    "url": ann.get("html_url", ""),
-                                    "message": soup.get_text(strip=True),
-                                    "posted_at": posted_date.strftime(
-                                        "%Y-%m-%d %H:%M:%S"
-                                    ),
-                                }
-                            )
-            else:
-                print(
-                    f"Error fetching announcements for {class_name}: {response.status_code}"
-                )
-        except Exception as e:
-            print(f"Exception for class {class_name}: {e}")
-
-    return announcements_all
-
-
 # Return a list of announcements from a class from the past 7 days
 async def getAnnouncements(
     canvasToken: str, classID: int, CANVAS_BASE_URL
-) -> List[Dict]:
+) -> List[Announcement]:
     """
     Get announcements for a specific class from the past 7 days.
-    Returns a list of dictionaries with title and url.
-    Example: [{"title": "Exam Reminder", "url": "https://canvas.com/class123/announcement456"}]
+    Returns Announcement records with their message rendered to plain text.
     """
-    headers = {"Authorization": f"Bearer {canvasToken}"}
-
     now = datetime.now(timezone.utc)
     seven_days_ago = now - timedelta(days=7)
+    cutoff = int(seven_days_ago.timestamp())
+    # A day-aligned start keeps the URL stable so stored copies can be revalidated
+    window_start = seven_days_ago.replace(hour=0, minute=0, second=0, microsecond=0)
 
     try:
-        response = requests.get(
-            f"{CANVAS_BASE_URL}/api/v1/courses/{classID}/discussion_topics",
-            headers=headers,
-            params={"only_announcements": True},
+        # Canvas only returns announcements posted inside the window. Without an
+        # end_date Canvas uses 28 days after start_date, which covers today.
+        announcements = canvasClient.paginate(
+            canvasToken,
+            CANVAS_BASE_URL,
+            "/api/v1/announcements",
+            params={
+                "context_codes[]": f"course_{classID}",
+                "start_date": _canvasTime(window_start),
+            },
+            cacheScope=canvasClient.SHARED_SCOPE,
         )
-
-        if response.status_code == 200:
-            announcements = response.json()
-            result = []
-
-            for ann in announcements:
-                posted_at = ann.get("posted_at")
-                title = ann.get("title", "No Title")
-                url = ann.get("html_url", "")
-
-                if posted_at:
-                    try:
-                        posted_time = datetime.fromisoformat(
-                            posted_at.replace("Z", "+00:00")
-                        )
-                        if posted_time >= seven_days_ago:
-                            result.append({"title": title, "url": url})
-                    except ValueError:
-                        continue
-
-            return result
-        else:
-            print(f"Error fetching announcements: {response.status_code}")
-            return []
+        posted = []
+        async for ann in announcements:
+            record = Announcement.fromCanvas(ann)
+            if record is not None and record.posted >= cutoff:
+                posted.append((record, ann))
+        # Rendered together so uncached bodies share worker dispatches
+        texts = await asyncio.gather(*(announcementText(ann) for _, ann in posted))
+        for (record, _), text in zip(posted, texts):
+            record.message = text
+        return [record for record, _ in posted]
+    except canvasClient.RateLimited:
+        raise
+    except canvasClient.CanvasError as e:
+        print(f"Error fetching announcements: {e.status}")
+        return []
     except Exception as e:
         print(f"Exception in getAnnouncements: {e}")
         return []
@@ -141,67 +97,181 @@ async def getAnnouncements(
 
 # Returns assignments due in the next 3 months from a given class
 async def getAssignments(
-    CANVAS_TOKEN: str, classID: int, className: str, CANVAS_BASE_URL
-) -> List[Dict]:
+    CANVAS_TOKEN: str,
+    classID: int,
+    className: str,
+    CANVAS_BASE_URL,
+    dueBefore: Optional[datetime] = None,
+) -> List[Assignment]:
     """
-    Get assignments for a specific class due in the next 3 months.
-    Returns a list of dictionaries with assignment details.
+    Get assignments for a specific class due in the next 3 months,
+    or before `dueBefore` if that is sooner.
+    Returns Assignment records sorted by due date.
     """
-    headers = {"Authorization": f"Bearer {CANVAS_TOKEN}"}
-
-    # Get current UTC time and future cutoff
+    # Get current UTC time and future cutoff as epoch seconds
     now = datetime.now(timezone.utc)
     three_months_later = now + timedelta(days=90)
+    if dueBefore is not None and dueBefore < three_months_later:
+        three_months_later = dueBefore
+    start, end = int(now.timestamp()), int(three_months_later.timestamp())
 
     try:
         # Get class name from API if not provided
         if not className:
-            class_response = requests.get(
-                f"{CANVAS_BASE_URL}/api/v1/courses/{classID}", headers=headers
+            class_response = await canvasClient.get(
+                CANVAS_TOKEN, CANVAS_BASE_URL, f"/api/v1/courses/{classID}"
             )
-            if class_response.status_code == 200:
-                class_info = class_response.json()
+            if class_response.ok:
+                class_info = class_response.data
                 className = class_info.get("name", f"Class {classID}")
             else:
                 className = f"Class {classID}"
 
-        # Get all assignments
-        response = requests.get(
-            f"{CANVAS_BASE_URL}/api/v1/courses/{classID}/assignments", headers=headers
+        # Stream only not-yet-due assignments, in due date order. The "future"
+        # bucket is used rather than "upcoming", which stops at one week out.
+        assignments = canvasClient.paginate(
+            CANVAS_TOKEN,
+            CANVAS_BASE_URL,
+            f"/api/v1/courses/{classID}/assignments",
+            params={"bucket": "future", "order_by": "due_at"},
+            cacheScope=canvasClient.SHARED_SCOPE,
+            transform=partial(canvasRecords.assignmentPage, classID, className),
         )
-        if response.status_code != 200:
-            print(f"Error fetching assignments: {response.status_code}")
-            return []
-
-        assignments = response.json()
         result = []
 
-        for assignment in assignments:
-            due_str = assignment.get("due_at")
-            if not due_str:
-                continue
-
-            # Convert to timezone-aware datetime
-            try:
-                due_date = datetime.fromisoformat(due_str.replace("Z", "+00:00"))
-            except Exception as e:
-                print(f"Skipping assignment due to date parsing error: {e}")
-                continue
+        async with aclosing(assignments):
+            async for assignment in assignments:
+                # Everything after this is due past the end of the window
+                if assignment.due > end:
+                    break
+                if start <= assignment.due:
+                    result.append(assignment)
 
-            # Check if it's within the next 3 months
-            if now <= due_date <= three_months_later:
-                result.append(
-                    {
-                        "title": assignment.get("name", "Unnamed Assignment"),
-                        "due_date": due_date,
-                        "class_name": className,
-                        "class_id": classID,
-                    }
-                )
-
-        result.sort(key=lambda x: x["due_date"])
+        result.sort(key=lambda a: a.due)
         return result
 
+    except canvasClient.RateLimited:
+        raise
+    except canvasClient.CanvasError as e:
+        print(f"Error fetching assignments: {e.status}")
+        return []
     except Exception as e:
         print(f"Exception in getAssignments: {e}")
         return []
+
+
+# Returns announcements in a class posted after `since`, oldest first
+async def getAnnouncementsSince(
+    canvasToken: str, classID: int, CANVAS_BASE_URL, since: datetime
+) -> List[Announcement]:
+    """
+    Used by the notification poller to fetch only announcements newer than
+    its last high-water mark.
+    Returns Announcement records, oldest first.
+    """
+    after = since.timestamp()
+    try:
+        announcements = canvasClient.paginate(
+            canvasToken,
+            CANVAS_BASE_URL,
+            "/api/v1/announcements",
+            params={
+                "context_codes[]": f"course_{classID}",
+                "start_date": _canvasTime(since),
+                "end_date": _canvasTime(datetime.now(timezone.utc)),
+            },
+            transform=canvasRecords.announcementPage,
+        )
+        result = [ann async for ann in announcements if ann.posted > after]
+        result.sort(key=lambda a: a.posted)
+        return result
+    except canvasClient.RateLimited:
+        raise
+    except canvasClient.CanvasError as e:
+        print(f"Error fetching new announcements: {e.status}")
+        return []
+    except Exception as e:
+        print(f"Exception in getAnnouncementsSince: {e}")
+        return []
+
+
+# Returns not-yet-due assignments in a class updated after `since`
+async def getAssignmentsUpdatedSince(
+    CANVAS_TOKEN: str,
+    classID: int,
+    className: str,
+    CANVAS_BASE_URL,
+    since: datetime,
+) -> List[Assignment]:
+    """
+    Canvas has no updated_since filter for assignments, so this pages through
+    the future bucket and keeps only rows whose updated_at passed `since`.
+    Returns Assignment records.
+    """
+    after = since.timestamp()
+    try:
+        assignments = canvasClient.paginate(
+            CANVAS_TOKEN,
+            CANVAS_BASE_URL,
+            f"/api/v1/courses/{classID}/assignments",
+            params={"bucket": "future", "order_by": "due_at"},
+            cacheScope=canvasClient.SHARED_SCOPE,
+            transform=partial(canvasRecords.assignmentPage, classID, className),
+        )
+        return [
+            assignment
+            async for assignment in assignments
+            if assignment.updated is not None and assignment.updated > after
+        ]
+    except canvasClient.RateLimited:
+        raise
+    except canvasClient.CanvasError as e:
+        print(f"Error fetching updated assignments: {e.status}")
+        return []
+    except Exception as e:
+        print(f"Exception in getAssignmentsUpdatedSince: {e}")
+        return []
+
+
+# Returns the calling user's submissions in a class graded after `since`
+async def getGradedSince(
+    CANVAS_TOKEN: str, classID: int, CANVAS_BASE_URL, since: datetime
+) -> List[Dict]:
+    """
+    Returns dictionaries with title, url, grade and graded_at (datetime).
+    """
+    try:
+        submissions = canvasClient.paginate(
+            CANVAS_TOKEN,
+            CANVAS_BASE_URL,
+            f"/api/v1/courses/{classID}/students/submissions",
+            params=[("graded_since", _canvasTime(since)), ("include[]", "assignment")],
+        )
+        result = []
+        async for submission in submissions:
+            graded_str = submission.get("graded_at")
+            if not graded_str:
+                continue
+            graded_at = parseCanvasTime(graded_str)
+            # graded_since is sent in whole seconds, so the submission that set
+            # the mark can come back; it was already reported
+            if graded_at <= since:
+                continue
+            assignment = submission.get("assignment") or {}
+            result.append(
+                {
+                    "title": assignment.get("name", "Unnamed Assignment"),
+                    "url": assignment.get("html_url", ""),
+                    "grade": submission.get("grade"),
+                    "graded_at": graded_at,
+                }
+            )
+        return result
+    except canvasClient.RateLimited:
+        raise
+    except canvasClient.CanvasError as e:
+        print(f"Error fetching graded submissions: {e.status}")
+        return []
+    except Exception as e:
+        print(f"Exception in getGradedSince: {e}")
+        return []
@@ -0,0 +1,371 @@
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import time
+import canvasFunctions
+import databaseFunctions
+from canvasRecords import datetimeFromEpoch
+from canvasScheduler import backgroundPriority
+from classListCache import getClassListCached
+from sharding import ShardConfig
+
+# Seconds between polling cycles
+POLL_INTERVAL = 300
+# Courses (or per-user grade checks) polled at the same time
+MAX_CONCURRENT_POLLS = 8
+# Watermark key prefix for the last seen due date of each assignment
+DUE_DATE_PREFIX = "due|"
+
+
+class ChangeEvent:
+    """
+    One detected change in a course, with the Discord users it should go to.
+    `kind` is "announcement", "due_date" or "grade".
+    """
+
+    __slots__ = (
+        "kind",
+        "classID",
+        "className",
+        "title",
+        "url",
+        "detail",
+        "targets",
+    )
+
+    def __init__(
+        self,
+        kind: str,
+        classID: int,
+        className: str,
+        title: str,
+        url: str,
+        detail: str,
+        targets: List[int],
+    ):
+        self.kind = kind
+        self.classID = classID
+        self.className = className
+        self.title = title
+        self.url = url
+        self.detail = detail
+        self.targets = targets
+
+
+class _Course:
+    __slots__ = ("domain", "classID", "name", "subscribers")
+
+    def __init__(self, domain: str, classID: int, name: str):
+        self.domain = domain
+        self.classID = classID
+        self.name = name
+        self.subscribers: List[Dict] = []
+
+
+# Converts a naive UTC datetime from MySQL into an aware one
+def _fromDatabase(mark: Optional[datetime]) -> Optional[datetime]:
+    return mark.replace(tzinfo=timezone.utc) if mark else None
+
+
+# Converts an aware datetime into the naive UTC form stored in MySQL
+def _toDatabase(mark: datetime) -> datetime:
+    return mark.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class CanvasPoller:
+    """
+    Detects new announcements, due-date changes and grade postings.
+    Announcements and assignments are polled once per course no matter how
+    many subscribers share it; grades are per user. Each check only asks
+    Canvas for items past its persisted high-water mark. Detected changes are
+    published through changes() with targets already filtered by each user's
+    notification settings.
+
+    In a sharded deployment each process fetches the class lists of the
+    subscribers it owns and stores them as enrollments in MySQL. Courses are
+    then built from every process's enrollments, and each process polls only
+    the courses in its own partition. Every class list and every course (with
+    the grade checks of everyone enrolled in it) is fetched by exactly one
+    process.
+    """
+
+    def __init__(
+        self, interval: float = POLL_INTERVAL, shard: Optional[ShardConfig] = None
+    ):
+        self.interval = interval
+        self.shard = shard or ShardConfig()
+        self.cycles = 0
+        self._queue: "asyncio.Queue[ChangeEvent]" = asyncio.Queue()
+        self._limit = asyncio.Semaphore(MAX_CONCURRENT_POLLS)
+        # Last seen due date (epoch seconds) per (domain, assignment ID), backed
+        # by the watermarks table so restarts don't re-announce unchanged dates
+        self._due_dates: Dict[Tuple[str, int], int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # The stream of detected changes, consumed by the notification fan-out
+    async def changes(self) -> AsyncIterator[ChangeEvent]:
+        while True:
+            yield await self._queue.get()
+
+    async def _run(self):
+        # Polling yields to slash commands when Canvas capacity is tight
+        with backgroundPriority():
+            await self._loop()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.pollOnce()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error polling Canvas: {e}")
+            await asyncio.sleep(self.interval)
+
+    # Stores the enrollments of the subscribers this process owns
+    async def _refreshEnrollments(self, subscribers: List[Dict]):
+        owned = [s for s in subscribers if self.shard.ownsUser(int(s["discordID"]))]
+
+        async def classesFor(sub: Dict):
+            async with self._limit:
+                return await getClassListCached(
+                    int(sub["discordID"]), sub["token"], sub["domain"]
+                )
+
+        class_lists = await asyncio.gather(
+            *(classesFor(sub) for sub in owned), return_exceptions=True
+        )
+        refreshed, rows = [], []
+        for sub, classes in zip(owned, class_lists):
+            # A failed fetch keeps the user's last stored enrollments
+            if isinstance(classes, BaseException):
+                continue
+            discordID = int(sub["discordID"])
+            refreshed.append(discordID)
+            rows += [(discordID, sub["domain"], c.id, c.name) for c in classes]
+        try:
+            await databaseFunctions.replaceEnrollments(refreshed, rows)
+        except Exception as e:
+            print(f"Error storing course enrollments: {e}")
+
+    # Groups subscribers by the courses they are enrolled in, keeping the
+    # courses this process owns
+    async def _collectCourses(self, subscribers: List[Dict]) -> List[_Course]:
+        await self._refreshEnrollments(subscribers)
+        by_id = {int(sub["discordID"]): sub for sub in subscribers}
+        courses: Dict[Tuple[str, int], _Course] = {}
+        for row in await databaseFunctions.getEnrollments():
+            sub = by_id.get(int(row["discordID"]))
+            # Skips users with notifications off, or who moved to another domain
+            if sub is None or sub["domain"] != row["domain"]:
+                continue
+            key = (row["domain"], int(row["classID"]))
+            if not self.shard.ownsCourse(*key):
+                continue
+            if key not in courses:
+                courses[key] = _Course(key[0], key[1], row["className"])
+            courses[key].subscribers.append(sub)
+        return list(courses.values())
+
+    # Runs one polling cycle over every subscribed course
+    async def pollOnce(self):
+        subscribers = await databaseFunctions.getNotificationSubscribers()
+        courses = await self._collectCourses(subscribers)
+
+        keys = []
+        for course in courses:
+            base = f"{course.domain}|{course.classID}"
+            keys += [f"{base}|announcements", f"{base}|assignments"]
+            keys += [
+                f"{base}|grades|{sub['discordID']}"
+                for sub in course.subscribers
+                if sub["grade_postings"]
+            ]
+        marks = {
+            key: _fromDatabase(mark)
+            for key, mark in (await databaseFunctions.getWatermarks(keys)).items()
+        }
+        new_marks: Dict[str, datetime] = {}
+
+        jobs = []
+        for course in courses:
+            jobs.append(self._pollAnnouncements(course, marks, new_marks))
+            jobs.append(self._pollAssignments(course, marks, new_marks))
+            for sub in course.subscribers:
+                if sub["grade_postings"]:
+                    jobs.append(self._pollGrades(course, sub, marks, new_marks))
+        await asyncio.gather(*jobs, return_exceptions=True)
+
+        await databaseFunctions.setWatermarks(
+            {key: _toDatabase(mark) for key, mark in new_marks.items()}
+        )
+        await self._pruneDueDates()
+        self.cycles += 1
+
+    # Forgets due dates that have passed, in memory and in MySQL
+    async def _pruneDueDates(self):
+        now = time.time()
+        for key in [k for k, due in self._due_dates.items() if due < now]:
+            del self._due_dates[key]
+        try:
+            await databaseFunctions.deleteExpiredDueDates(DUE_DATE_PREFIX)
+        except Exception as e:
+            print(f"Error pruning stored due dates: {e}")
+
+    # Fills in the last seen due dates of `assignments` not held in memory
+    async def _loadDueDates(self, domain: str, assignments: List):
+        missing = {
+            f"{DUE_DATE_PREFIX}{domain}|{a.id}": (domain, a.id)
+            for a in assignments
+            if (domain, a.id) not in self._due_dates
+        }
+        if not missing:
+            return
+        stored = await databaseFunctions.getWatermarks(list(missing))
+        for key, mark in stored.items():
+            self._due_dates[missing[key]] = int(_fromDatabase(mark).timestamp())
+
+    # Returns the stored mark, or records `now` as the first mark and returns None
+    def _startMark(
+        self, key: str, marks: Dict[str, datetime], new_marks: Dict[str, datetime]
+    ) -> Optional[datetime]:
+        mark = marks.get(key)
+        if mark is None:
+            # First time this course is seen, start tracking without notifying
+            new_marks[key] = datetime.now(timezone.utc)
+        return mark
+
+    async def _pollAnnouncements(self, course: _Course, marks, new_marks):
+        key = f"{course.domain}|{course.classID}|announcements"
+        since = self._startMark(key, marks, new_marks)
+        if since is None:
+            return
+        sub = course.subscribers[0]
+        async with self._limit:
+            announcements = await canvasFunctions.getAnnouncementsSince(
+                sub["token"], course.classID, course.domain, since
+            )
+        if not announcements:
+            return
+
+        targets = [
+            int(s["discordID"])
+            for s in course.subscribers
+            if s["announcement_postings"]
+        ]
+        for ann in announcements:
+            self._publish(
+                ChangeEvent(
+                    "announcement",
+                    course.classID,
+                    course.name,
+                    ann.title,
+                    ann.url,
+                    "New announcement",
+                    targets,
+                )
+            )
+        new_marks[key] = announcements[-1].posted_date
+
+    # Records the due dates of a newly tracked course's upcoming assignments,
+    # so a later edit of one isn't announced as a new due date
+    async def _seedDueDates(self, course: _Course):
+        sub = course.subscribers[0]
+        async with self._limit:
+            assignments = await canvasFunctions.getAssignmentsUpdatedSince(
+                sub["token"],
+                course.classID,
+                course.name,
+                course.domain,
+                datetimeFromEpoch(0),
+            )
+        seeded: Dict[str, datetime] = {}
+        for assignment in assignments:
+            self._due_dates[(course.domain, assignment.id)] = assignment.due
+            seeded[f"{DUE_DATE_PREFIX}{course.domain}|{assignment.id}"] = (
+                _toDatabase(assignment.due_date)
+            )
+        await databaseFunctions.setDueDates(seeded)
+
+    async def _pollAssignments(self, course: _Course, marks, new_marks):
+        key = f"{course.domain}|{course.classID}|assignments"
+        since = self._startMark(key, marks, new_marks)
+        if since is None:
+            await self._seedDueDates(course)
+            return
+        sub = course.subscribers[0]
+        async with self._limit:
+            assignments = await canvasFunctions.getAssignmentsUpdatedSince(
+                sub["token"], course.classID, course.name, course.domain, since
+            )
+        if not assignments:
+            return
+
+        await self._loadDueDates(course.domain, assignments)
+        targets = [int(s["discordID"]) for s in course.subscribers if s["due_dates"]]
+        changed: Dict[str, datetime] = {}
+        for assignment in assignments:
+            seen_key = (course.domain, assignment.id)
+            previous = self._due_dates.get(seen_key)
+            self._due_dates[seen_key] = assignment.due
+            # Edits that didn't touch the due date are not worth a DM
+            if previous == assignment.due:
+                continue
+            changed[f"{DUE_DATE_PREFIX}{course.domain}|{assignment.id}"] = (
+                _toDatabase(assignment.due_date)
+            )
+            due = assignment.due_date.strftime("%b %d %H:%M UTC")
+            detail = f"Due date changed to {due}" if previous else f"Due {due}"
+            self._publish(
+                ChangeEvent(
+                    "due_date",
+                    course.classID,
+                    course.name,
+                    assignment.title,
+                    assignment.url,
+                    detail,
+                    targets,
+                )
+            )
+        await databaseFunctions.setDueDates(changed)
+        new_marks[key] = datetimeFromEpoch(max(a.updated for a in assignments))
+
+    async def _pollGrades(self, course: _Course, sub: Dict, marks, new_marks):
+        key = f"{course.domain}|{course.classID}|grades|{sub['discordID']}"
+        since = self._startMark(key, marks, new_marks)
+        if since is None:
+            return
+        async with self._limit:
+            graded = await canvasFunctions.getGradedSince(
+                sub["token"], course.classID, course.domain, since
+            )
+        if not graded:
+            return
+
+        for submission in graded:
+            grade = submission["grade"]
+            self._publish(
+                ChangeEvent(
+                    "grade",
+                    course.classID,
+                    course.name,
+                    submission["title"],
+                    submission["url"],
+                    f"Graded: {grade}" if grade is not None else "Graded",
+                    [int(sub["discordID"])],
+                )
+            )
+        new_marks[key] = max(s["graded_at"] for s in graded)
+
+    def _publish(self, event: ChangeEvent):
+        if event.targets:
+            self._queue.put_nowait(event)
@@ -0,0 +1,176 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Canvas timestamps are whole seconds in UTC, so they are kept as epoch ints:
+# cheap to compare and sort, and much smaller than datetime objects
+
+
+# Converts a Canvas ISO 8601 timestamp to seconds since the epoch
+def epochFromCanvas(value: str) -> int:
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+# Converts seconds since the epoch to an aware UTC datetime, for formatting
+def datetimeFromEpoch(epoch: int) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+
+class Course:
+    """A course the user is actively enrolled in."""
+
+    __slots__ = ("id", "name")
+
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"Course({self.id!r}, {self.name!r})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Course):
+            return NotImplemented
+        return self.id == other.id and self.name == other.name
+
+    def __hash__(self) -> int:
+        return hash((self.id, self.name))
+
+    @classmethod
+    def fromCanvas(cls, course: Dict) -> "Course":
+        return cls(course["id"], course["name"])
+
+
+class Assignment:
+    """
+    A dated assignment. `due` and `updated` are epoch seconds; `due_date` gives
+    the due time as a datetime for display.
+    """
+
+    __slots__ = ("id", "title", "url", "due", "updated", "course_id", "course_name")
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        url: str,
+        due: int,
+        updated: Optional[int],
+        course_id: int,
+        course_name: str,
+    ):
+        self.id = id
+        self.title = title
+        self.url = url
+        self.due = due
+        self.updated = updated
+        self.course_id = course_id
+        self.course_name = course_name
+
+    def __repr__(self) -> str:
+        return f"Assignment({self.id!r}, {self.title!r}, due={self.due})"
+
+    @property
+    def due_date(self) -> datetime:
+        return datetimeFromEpoch(self.due)
+
+    # Builds an assignment from Canvas JSON, or None if it has no due date
+    @classmethod
+    def fromCanvas(
+        cls, assignment: Dict, courseID: int, courseName: str
+    ) -> Optional["Assignment"]:
+        due_at = assignment.get("due_at")
+        if not due_at:
+            return None
+        updated_at = assignment.get("updated_at")
+        return cls(
+            assignment.get("id"),
+            assignment.get("name", "Unnamed Assignment"),
+            assignment.get("html_url", ""),
+            epochFromCanvas(due_at),
+            epochFromCanvas(updated_at) if updated_at else None,
+            courseID,
+            courseName,
+        )
+
+
+class Announcement:
+    """
+    An announcement posted in a course. `posted` is epoch seconds and
+    `message` is the rendered plain text, when it was asked for.
+    """
+
+    __slots__ = ("id", "title", "url", "posted", "course_id", "course_name", "message")
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        url: str,
+        posted: int,
+        course_id: Optional[int] = None,
+        course_name: str = "",
+        message: str = "",
+    ):
+        self.id = id
+        self.title = title
+        self.url = url
+        self.posted = posted
+        self.course_id = course_id
+        self.course_name = course_name
+        self.message = message
+
+    def __repr__(self) -> str:
+        return f"Announcement({self.id!r}, {self.title!r}, posted={self.posted})"
+
+    @property
+    def posted_date(self) -> datetime:
+        return datetimeFromEpoch(self.posted)
+
+    # Builds an announcement from Canvas JSON, or None if it was never posted
+    @classmethod
+    def fromCanvas(cls, announcement: Dict) -> Optional["Announcement"]:
+        posted_at = announcement.get("posted_at")
+        if not posted_at:
+            return None
+        context = announcement.get("context_code", "")
+        return cls(
+            announcement.get("id"),
+            announcement.get("title", "No Title"),
+            announcement.get("html_url", ""),
+            epochFromCanvas(posted_at),
+            int(context[len("course_") :]) if context.startswith("course_") else None,
+        )
+
+
+# Worker-stage transforms from a decoded Canvas page straight to records.
+# They are module-level so they can be sent to a process pool.
+
+
+def coursePage(page: List[Dict]) -> List[Course]:
+    # Courses without a name are access restricted
+    return [Course.fromCanvas(course) for course in page if "name" in course]
+
+
+def announcementPage(page: List[Dict]) -> List[Announcement]:
+    records = []
+    for announcement in page:
+        record = Announcement.fromCanvas(announcement)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+# Bind the course with functools.partial, Canvas doesn't repeat it per item
+def assignmentPage(
+    courseID: int, courseName: str, page: List[Dict]
+) -> List[Assignment]:
+    records = []
+    for assignment in page:
+        try:
+            record = Assignment.fromCanvas(assignment, courseID, courseName)
+        except ValueError as e:
+            print(f"Skipping assignment due to date parsing error: {e}")
+            continue
+        if record is not None:
+            records.append(record)
+    return records
@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+# Request priorities, lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Background requests leave this fraction of every token bucket for commands
+BACKGROUND_RESERVE = 0.5
+
+# Priority of Canvas requests made from the current task
+_priority: ContextVar[int] = ContextVar("canvas_priority", default=INTERACTIVE)
+
+
+def currentPriority() -> int:
+    return _priority.get()
+
+
+# Marks Canvas requests made inside the block (and tasks it starts) as background
+@contextmanager
+def backgroundPriority():
+    reset = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(reset)
+
+
+# Returns a full-jitter exponential backoff delay for a retry attempt
+def backoffDelay(attempt: int, base: float = 0.5, cap: float = 20) -> float:
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second with bursts of up to `capacity`.
+    Background requests wait while the bucket is below its reserve, so
+    interactive commands always find tokens left.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def take(self, priority: int = INTERACTIVE):
+        reserve = self.capacity * BACKGROUND_RESERVE if priority else 0
+        while True:
+            self._refill()
+            if self._tokens - 1 >= reserve:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 + reserve - self._tokens) / self.rate)
+
+    # Empties the bucket, e.g. after Canvas reports the quota is exhausted
+    def drain(self):
+        self._refill()
+        self._tokens = min(self._tokens, 0)
+
+
+class AdaptiveLimiter:
+    """
+    A concurrency limit that adapts AIMD-style: it grows by roughly one slot
+    per round of successful requests and halves when Canvas signals it is
+    close to throttling. Waiters are admitted in priority order.
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._last_decrease = 0.0
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # A slot granted just before cancellation must be handed back
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wakeWaiters()
+
+    def _wakeWaiters(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def increase(self):
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wakeWaiters()
+
+    def decrease(self):
+        # Only halve once per second, requests already in flight report late
+        now = time.monotonic()
+        if now - self._last_decrease >= 1:
+            self._last_decrease = now
+            self.limit = max(self.minimum, self.limit / 2)
+
+    async def __aenter__(self):
+        await self.acquire(currentPriority())
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+# Parses Canvas' X-Rate-Limit-Remaining header, if present
+def rateLimitRemaining(headers) -> Optional[float]:
+    value = headers.get("X-Rate-Limit-Remaining") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,25 @@
+from typing import List
+from ttlCache import TTLCache
+import canvasFunctions
+from canvasRecords import Course
+
+# Course lists keyed by (Discord user ID, Canvas domain), shared by autocomplete,
+# the slash commands and background jobs so Canvas isn't asked on every keystroke
+class_list_cache = TTLCache(maxsize=2048, ttl=300)
+
+
+# Returns the user's course list, from memory when possible
+async def getClassListCached(
+    discordID: int, canvas_token: str, canvas_domain: str
+) -> List[Course]:
+    # Empty lists usually mean Canvas failed, so they aren't kept
+    return await class_list_cache.getOrLoad(
+        (discordID, canvas_domain),
+        lambda: canvasFunctions.getClassList(canvas_token, canvas_domain),
+        shouldCache=bool,
+    )
+
+
+# Forgets every cached course list for a user, e.g. after /logout
+def invalidateUser(discordID: int):
+    class_list_cache.invalidate(lambda key: key[0] == discordID)
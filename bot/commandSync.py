@@ -0,0 +1,57 @@
+from typing import Dict, Optional
+import hashlib
+import json
+import os
+import discord
+from discord import app_commands
+
+# Hashes of the last synced command definitions, kept between restarts
+SYNC_STATE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".command_sync.json"
+)
+# Set to 1 to sync even when nothing changed, e.g. after editing commands by hand
+FORCE_SYNC_ENV = "CANVASCORD_FORCE_SYNC"
+
+
+# Hash of the command payloads Discord would receive for `guild` (None = global)
+def treeHash(tree: app_commands.CommandTree, guild: Optional[discord.Object]) -> str:
+    payload = [command.to_dict(tree) for command in tree.get_commands(guild=guild)]
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _loadState() -> Dict[str, str]:
+    try:
+        with open(SYNC_STATE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _saveState(state: Dict[str, str]):
+    temp_path = SYNC_STATE_PATH + ".tmp"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, SYNC_STATE_PATH)
+    except OSError as e:
+        print(f"Error saving command sync state: {e}")
+
+
+# Syncs the tree for `guild` only if its definitions changed since the last
+# sync by this application. Returns the number of commands synced, or None
+# if the sync was skipped.
+async def syncIfChanged(
+    tree: app_commands.CommandTree, guild: Optional[discord.Object] = None
+) -> Optional[int]:
+    application_id = tree.client.application_id
+    scope = f"{application_id}:{'global' if guild is None else guild.id}"
+    digest = treeHash(tree, guild)
+    state = _loadState()
+    if state.get(scope) == digest and os.environ.get(FORCE_SYNC_ENV) != "1":
+        return None
+    synced = await tree.sync(guild=guild)
+    state[scope] = digest
+    _saveState(state)
+    return len(synced)
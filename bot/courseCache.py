@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+import canvasFunctions
+from canvasRecords import Announcement, Assignment
+from classListCache import getClassListCached
+from ttlCache import TTLCache
+
+# How long course-level data is shared before Canvas is asked again
+COURSE_TTL = 300
+# Empty results often mean a failed request, so they are retried sooner
+EMPTY_TTL = 30
+
+# Non-personalized course data keyed by (domain, class ID, kind). Every entry
+# holds the widest window any command asks for and is narrowed per request.
+course_cache = TTLCache(maxsize=1024, ttl=COURSE_TTL)
+
+
+def _ttlFor(value: list) -> float:
+    return COURSE_TTL if value else EMPTY_TTL
+
+
+# Raises PermissionError unless the user's own course list contains the class
+async def _checkEnrollment(
+    discordID: int, canvas_token: str, canvas_domain: str, classID: int
+):
+    classes = await getClassListCached(discordID, canvas_token, canvas_domain)
+    if not any(course.id == classID for course in classes):
+        raise PermissionError("You are not enrolled in that class.")
+
+
+# Returns the last 7 days of announcements for a class, shared by all its users
+async def getAnnouncements(
+    discordID: int, canvas_token: str, canvas_domain: str, classID: int
+) -> List[Announcement]:
+    await _checkEnrollment(discordID, canvas_token, canvas_domain, classID)
+    return await course_cache.getOrLoad(
+        (canvas_domain, classID, "announcements"),
+        lambda: canvasFunctions.getAnnouncements(
+            canvas_token, classID, canvas_domain
+        ),
+        ttl=_ttlFor,
+    )
+
+
+# Returns assignments for a class due before `dueBefore`, shared by all its users
+async def getAssignments(
+    discordID: int,
+    canvas_token: str,
+    canvas_domain: str,
+    classID: int,
+    className: str,
+    dueBefore: Optional[datetime] = None,
+) -> List[Assignment]:
+    await _checkEnrollment(discordID, canvas_token, canvas_domain, classID)
+    # Always cache the full 90-day window so every end date can reuse it
+    assignments = await course_cache.getOrLoad(
+        (canvas_domain, classID, "assignments"),
+        lambda: canvasFunctions.getAssignments(
+            canvas_token, classID, className, canvas_domain
+        ),
+        ttl=_ttlFor,
+    )
+    start = int(datetime.now(timezone.utc).timestamp())
+    end = int(dueBefore.timestamp()) if dueBefore is not None else None
+    return [a for a in assignments if start <= a.due and (end is None or a.due < end)]
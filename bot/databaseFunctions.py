@@ -1,7 +1,17 @@
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, Any, Callable, List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import datetime
-import mysql.connector
+import threading
+import time
 import apiKey
+import metrics
+from tokenCache import EncryptedTokenCache
+
+# mysql-connector is imported by _getPool, on a worker thread, to keep it off
+# the startup path
+if TYPE_CHECKING:
+    from mysql.connector.pooling import MySQLConnectionPool
 
 # Replace with your actual MySQL database credentials
 DB_CONFIG = {
@@ -9,163 +19,696 @@ DB_CONFIG = {
     "user": apiKey.databaseUser,
     "password": apiKey.databasePassword,
     "database": apiKey.databaseName,
+    # Single statements commit themselves; multi-statement writes open a
+    # transaction, see _execute
+    "autocommit": True,
+}
+
+# Number of pooled connections, each served by its own worker thread
+POOL_SIZE = 5
+# Connections idle for longer are pinged before use, in case the server or a
+# proxy dropped them
+IDLE_PING_SECONDS = 60
+
+# Rows written per statement by the bulk functions
+BULK_CHUNK = 1000
+
+# Activity scores halve over this many seconds, see recordActivity
+ACTIVITY_HALF_LIFE = 7 * 24 * 3600
+
+_pool: Optional["MySQLConnectionPool"] = None
+_pool_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="db")
+# When each pooled connection, by server connection ID, was last returned
+# after a successful query. New connections and ones whose last query failed
+# have no entry and are pinged on their next checkout.
+_last_used: Dict[int, float] = {}
+# Callbacks registered with onRemindersAdded
+_reminders_added: List[Callable[[], None]] = []
+
+# Hot path: every interaction looks up the user's token
+CANVAS_TOKEN_QUERY = """
+SELECT ct.token, ct.domain
+FROM canvas_token ct
+JOIN users u ON ct.userID = u.userID
+WHERE u.discordID = %s
+"""
+
+# Hot path: read by /notification_settings
+NOTIFICATION_SETTINGS_QUERY = """
+SELECT c.enable_notifications, c.grade_postings, c.due_dates, c.announcement_postings
+FROM configurations c
+JOIN users u ON c.userID = u.userID
+WHERE u.discordID = %s
+"""
+
+# Hot path: a user's reminders
+REMINDERS_QUERY = """
+SELECT r.`when`, r.recurring, r.content
+FROM reminders r
+JOIN users u ON r.userID = u.userID
+WHERE u.discordID = %s
+"""
+
+# Hot path: the reminder scheduler's window loads
+UPCOMING_REMINDERS_QUERY = """
+SELECT r.reminderID, u.discordID, r.`when`, r.recurring, r.content
+FROM reminders r
+JOIN users u ON r.userID = u.userID
+WHERE r.`when` < %s
+  AND (r.`when` > %s OR (r.`when` = %s AND r.reminderID > %s))
+  AND MOD(u.discordID >> 22, %s) = %s
+ORDER BY r.`when`, r.reminderID
+LIMIT %s
+"""
+
+# Canvas tokens are read on almost every interaction, so hot users skip MySQL
+_token_cache = EncryptedTokenCache()
+
+# Pool metrics, updated from the worker threads
+_stats_lock = threading.Lock()
+_stats = {
+    "queries": 0,
+    "errors": 0,
+    "reconnects": 0,
+    "waiting": 0,
+    "in_use": 0,
+    "total_wait_seconds": 0.0,
+    # Result of the last healthCheck, 1 or 0
+    "healthy": 0,
 }
 
 
-# Helper function to create a new database connection
+def _bumpStat(name: str, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+# Creates the shared connection pool on first use
+def _getPool() -> "MySQLConnectionPool":
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from mysql.connector.pooling import MySQLConnectionPool
+
+                _pool = MySQLConnectionPool(
+                    pool_name="canvascord",
+                    pool_size=POOL_SIZE,
+                    # Sessions carry no state between queries worth resetting
+                    pool_reset_session=False,
+                    **DB_CONFIG,
+                )
+    return _pool
+
+
+# Helper function to borrow a connection from the pool
 def get_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    conn = _getPool().get_connection()
+    last_used = _last_used.pop(conn.connection_id, None)
+    # Pinging costs a round trip, so only connections that were idle for a
+    # while or failed last time are checked
+    if last_used is None or time.monotonic() - last_used > IDLE_PING_SECONDS:
+        if not conn.is_connected():
+            conn.reconnect(attempts=2, delay=0)
+            _bumpStat("reconnects")
+    return conn
 
 
-# Retrieves the Canvas API token and domain for a given Discord user ID
-async def getCanvasToken(discordID: int) -> Optional[tuple[str, str]]:
+# Runs `work(cursor)` on a pooled connection inside a worker thread
+def _runQuery(work: Callable, dictionary: bool, transaction: bool, queued_at: float):
+    waited = time.perf_counter() - queued_at
+    _bumpStat("waiting", -1)
+    _bumpStat("total_wait_seconds", waited)
+    metrics.db_pool_wait_seconds.observe(waited)
+    _bumpStat("in_use")
+    conn = None
+    cursor = None
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT ct.token, ct.domain
-            FROM canvas_token ct
-            JOIN users u ON ct.userID = u.userID
-            WHERE u.discordID = %s
-            """,
-            (discordID,),
-        )
+        cursor = conn.cursor(dictionary=dictionary)
+        if transaction:
+            conn.start_transaction()
+        result = work(cursor)
+        if transaction:
+            conn.commit()
+        _bumpStat("queries")
+        _last_used[conn.connection_id] = time.monotonic()
+        return result
+    except Exception:
+        _bumpStat("errors")
+        if transaction and conn is not None and conn.in_transaction:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        raise
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            # Returns the connection to the pool
+            conn.close()
+        _bumpStat("in_use", -1)
+
+
+# Schedules database work without blocking the event loop. Connections
+# autocommit, so a write of one statement is one round trip; work that runs
+# several statements passes `transaction` to make them atomic.
+async def _execute(
+    work: Callable[[Any], Any], dictionary: bool = False, transaction: bool = False
+) -> Any:
+    _bumpStat("waiting")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, _runQuery, work, dictionary, transaction, time.perf_counter()
+    )
+
+
+# Returns a snapshot of the pool metrics
+def poolStats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pool_size"] = POOL_SIZE
+    stats["idle"] = POOL_SIZE - stats["in_use"]
+    return stats
+
+
+# Opens the pool and sets up the token cipher on a worker thread, so the
+# first command after startup doesn't pay for the imports and connections,
+# then checks that the database answers
+async def warmUp():
+    def work():
+        _token_cache.prepare()
+        _getPool()
+
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_executor, work)
+    except Exception as e:
+        print(f"Error warming up the database pool: {e}")
+    await healthCheck()
+
+
+# Checks that the database answers a trivial query; the result is kept in
+# poolStats()["healthy"] for the metrics endpoint
+async def healthCheck() -> bool:
+    def work(cursor):
+        cursor.execute("SELECT 1")
+        return cursor.fetchone() is not None
+
+    try:
+        healthy = await _execute(work)
+    except Exception as e:
+        print(f"Database health check failed: {e}")
+        healthy = False
+    with _stats_lock:
+        _stats["healthy"] = int(healthy)
+    return healthy
+
+
+# Stops the worker threads once queued queries have finished
+def closePool():
+    _executor.shutdown(wait=True)
+
+
+# Caches a user's token and domain already read from the database, e.g. by
+# getActiveUsers, so their next command skips the token query
+def primeToken(discordID: int, token: str, domain: str):
+    _token_cache.put(discordID, (token, domain))
+
+
+# Drops a user's cached token, e.g. when another process logged them out
+def forgetToken(discordID: int):
+    _token_cache.evict(discordID)
+
+
+# Token cache (hits, misses), for the metrics endpoint
+def tokenCacheStats() -> Tuple[int, int]:
+    return _token_cache.stats()
+
+
+# Retrieves the Canvas API token and domain for a given Discord user ID
+async def getCanvasToken(discordID: int) -> Optional[tuple[str, str]]:
+    with metrics.phase("token_lookup"):
+        return await _token_cache.get(discordID, lambda: _queryCanvasToken(discordID))
+
+
+async def _queryCanvasToken(discordID: int) -> Optional[tuple[str, str]]:
+    def work(cursor):
+        cursor.execute(CANVAS_TOKEN_QUERY, (discordID,))
         result = cursor.fetchone()
         return (result[0], result[1]) if result else None
-    finally:
-        cursor.close()
-        conn.close()
+
+    return await _execute(work)
 
 
 # Retrieves all notification settings for a specific Discord user
 async def getNotificationSettings(discordID: int) -> Dict[str, bool]:
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            """
-            SELECT c.enable_notifications, c.grade_postings, c.due_dates, c.announcement_postings
-            FROM configurations c
-            JOIN users u ON c.userID = u.userID
-            WHERE u.discordID = %s
-            """,
-            (discordID,),
-        )
+    def work(cursor):
+        cursor.execute(NOTIFICATION_SETTINGS_QUERY, (discordID,))
         result = cursor.fetchone()
         return result if result else {}  # Return settings as a dictionary
-    finally:
-        cursor.close()
-        conn.close()
+
+    return await _execute(work, dictionary=True)
 
 
 # Updates or inserts multiple notification settings for a user
+# The userID is joined in from users, so this is a single round trip
 async def changeNotificationSettings(discordID: int, settings: Dict[str, bool]):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Get the internal userID
-        cursor.execute("SELECT userID FROM users WHERE discordID = %s", (discordID,))
-        result = cursor.fetchone()
-        if not result:
-            return  # User not found
-
-        userID = result[0]
+    columns = list(settings)
+    values = list(settings.values())
 
+    def work(cursor):
         # Prepare the SET clause dynamically for UPDATE
-        set_clause = ", ".join(f"{k} = %s" for k in settings)
-        values = list(settings.values()) + [userID]
+        set_clause = ", ".join(f"{k} = %s" for k in columns)
 
-        # Insert new record or update existing one using ON DUPLICATE KEY
+        # Inserts nothing if the user is not found
         cursor.execute(
             f"""
-            INSERT INTO configurations (userID, {', '.join(settings)})
-            VALUES ({', '.join(['%s'] * (len(settings) + 1))})
+            INSERT INTO configurations (userID, {', '.join(columns)})
+            SELECT u.userID, {', '.join(['%s'] * len(columns))}
+            FROM users u
+            WHERE u.discordID = %s
             ON DUPLICATE KEY UPDATE {set_clause}
             """,
-            values,
+            values + [discordID] + values,
         )
 
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
+    await _execute(work)
 
 
 # Fetches all saved reminders for a specific Discord user
 async def getReminders(discordID: int) -> List[Dict]:
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
+    def work(cursor):
+        cursor.execute(REMINDERS_QUERY, (discordID,))
+        return cursor.fetchall()  # Returns a list of reminder dictionaries
+
+    return await _execute(work, dictionary=True)
+
+
+# Adds a new reminder for a user with optional recurrence and a custom message
+# Returns the new reminderID, or None if the user was not found
+async def addReminder(
+    discordID: int, when: datetime.datetime, recurring: Optional[str], content: str
+) -> Optional[int]:
+    def work(cursor):
         cursor.execute(
             """
-            SELECT r.`when`, r.recurring, r.content
-            FROM reminders r
-            JOIN users u ON r.userID = u.userID
+            INSERT INTO reminders (userID, `when`, recurring, content)
+            SELECT u.userID, %s, %s, %s
+            FROM users u
             WHERE u.discordID = %s
             """,
-            (discordID,),
+            (when, recurring, content, discordID),
         )
-        results = cursor.fetchall()
-        return results  # Returns a list of reminder dictionaries
-    finally:
-        cursor.close()
-        conn.close()
+        return cursor.lastrowid if cursor.rowcount else None
 
+    return await _execute(work)
 
-# Adds a new reminder for a user with optional recurrence and a custom message
-async def addReminder(
-    discordID: int, when: datetime.datetime, recurring: Optional[str], content: str
+
+# Registers `callback` to run after addReminders inserts rows, so the reminder
+# scheduler can load ones due before its next load
+def onRemindersAdded(callback: Callable[[], None]):
+    _reminders_added.append(callback)
+
+
+# Adds many reminders at once, e.g. from an importer
+# Each row is (discordID, when, recurring, content); rows for unknown users
+# are skipped. Returns the number of reminders inserted.
+async def addReminders(
+    rows: List[Tuple[int, datetime.datetime, Optional[str], str]]
+) -> int:
+    if not rows:
+        return 0
+
+    def work(cursor):
+        inserted = 0
+        for start in range(0, len(rows), BULK_CHUNK):
+            chunk = rows[start : start + BULK_CHUNK]
+            # The rows become a derived table joined to users on discordID
+            derived = " UNION ALL ".join(
+                ["SELECT %s AS discordID, %s AS `when`, %s AS recurring, %s AS content"]
+                + ["SELECT %s, %s, %s, %s"] * (len(chunk) - 1)
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO reminders (userID, `when`, recurring, content)
+                SELECT u.userID, v.`when`, v.recurring, v.content
+                FROM ({derived}) v
+                JOIN users u ON u.discordID = v.discordID
+                """,
+                [value for row in chunk for value in row],
+            )
+            inserted += cursor.rowcount
+        return inserted
+
+    inserted = await _execute(work, transaction=True)
+    if inserted:
+        for callback in _reminders_added:
+            callback()
+    return inserted
+
+
+# Fetches reminders firing before `before`, ordered by fire time then reminderID
+# Resumes after the (afterWhen, afterID) position so large windows can be paged
+# Only users in `partition` of `partitions` are read, see sharding.userPartition
+async def getUpcomingReminders(
+    afterWhen: datetime.datetime,
+    afterID: int,
+    before: datetime.datetime,
+    limit: int,
+    partition: int = 0,
+    partitions: int = 1,
+) -> List[Dict]:
+    def work(cursor):
+        cursor.execute(
+            UPCOMING_REMINDERS_QUERY,
+            (before, afterWhen, afterWhen, afterID, partitions, partition, limit),
+        )
+        return cursor.fetchall()
+
+    return await _execute(work, dictionary=True)
+
+
+# Moves a recurring reminder from its `due` fire time to the next one
+# Returns False if it was already moved or deleted, e.g. by another process
+async def rescheduleReminder(
+    reminderID: int, due: datetime.datetime, when: datetime.datetime
+) -> bool:
+    def work(cursor):
+        cursor.execute(
+            "UPDATE reminders SET `when` = %s WHERE reminderID = %s AND `when` = %s",
+            (when, reminderID, due),
+        )
+        return cursor.rowcount == 1
+
+    return await _execute(work)
+
+
+# Removes a single reminder that fired at `due`
+# Returns False if it was already removed or moved, e.g. by another process
+async def deleteReminder(reminderID: int, due: datetime.datetime) -> bool:
+    def work(cursor):
+        cursor.execute(
+            "DELETE FROM reminders WHERE reminderID = %s AND `when` = %s",
+            (reminderID, due),
+        )
+        return cursor.rowcount == 1
+
+    return await _execute(work)
+
+
+# Completely deletes a user and their associated data (for logout or account reset)
+# Their token, settings and reminders go with them through ON DELETE CASCADE
+async def deleteUser(discordID: int):
+    def work(cursor):
+        cursor.execute("DELETE FROM users WHERE discordID = %s", (discordID,))
+
+    await _execute(work)
+    _token_cache.evict(discordID)
+
+
+# Deletes many users and their associated data, e.g. from a cleanup job
+# Returns the number of users deleted
+async def deleteUsers(discordIDs: List[int]) -> int:
+    if not discordIDs:
+        return 0
+
+    def work(cursor):
+        deleted = 0
+        for start in range(0, len(discordIDs), BULK_CHUNK):
+            chunk = discordIDs[start : start + BULK_CHUNK]
+            cursor.execute(
+                f"""
+                DELETE FROM users
+                WHERE discordID IN ({', '.join(['%s'] * len(chunk))})
+                """,
+                chunk,
+            )
+            deleted += cursor.rowcount
+        return deleted
+
+    deleted = await _execute(work, transaction=True)
+    for discordID in discordIDs:
+        _token_cache.evict(discordID)
+    return deleted
+
+
+# Fetches every user with notifications enabled, with their token and settings
+# Users without a configurations row get the table defaults (all enabled)
+async def getNotificationSubscribers() -> List[Dict]:
+    def work(cursor):
+        cursor.execute(
+            """
+            SELECT u.discordID, ct.token, ct.domain,
+                   COALESCE(c.grade_postings, TRUE) AS grade_postings,
+                   COALESCE(c.due_dates, TRUE) AS due_dates,
+                   COALESCE(c.announcement_postings, TRUE) AS announcement_postings
+            FROM users u
+            JOIN canvas_token ct ON ct.userID = u.userID
+            LEFT JOIN configurations c ON c.userID = u.userID
+            WHERE COALESCE(c.enable_notifications, TRUE)
+            """
+        )
+        return cursor.fetchall()
+
+    return await _execute(work, dictionary=True)
+
+
+# Adds command counts to users' activity scores, which halve every
+# ACTIVITY_HALF_LIFE seconds so recent use counts most. `activity` maps a
+# Discord ID to (commands, last active as naive UTC); unknown users are skipped.
+async def recordActivity(
+    activity: Dict[int, Tuple[int, datetime.datetime]], workerIndex: int = 0
 ):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
+    rows = list(activity.items())
+    if not rows:
+        return
 
-        # Get the internal userID
-        cursor.execute("SELECT userID FROM users WHERE discordID = %s", (discordID,))
-        result = cursor.fetchone()
-        if not result:
-            return  # User not found
+    def work(cursor):
+        for start in range(0, len(rows), BULK_CHUNK):
+            chunk = rows[start : start + BULK_CHUNK]
+            derived = " UNION ALL ".join(
+                ["SELECT %s AS discordID, %s AS commands, %s AS seen"]
+                + ["SELECT %s, %s, %s"] * (len(chunk) - 1)
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO user_activity (userID, score, lastActive, workerIndex)
+                SELECT u.userID, v.commands, v.seen, %s
+                FROM ({derived}) v
+                JOIN users u ON u.discordID = v.discordID
+                ON DUPLICATE KEY UPDATE
+                    score = user_activity.score * POW(
+                        0.5,
+                        GREATEST(
+                            TIMESTAMPDIFF(SECOND, user_activity.lastActive, v.seen), 0
+                        ) / %s
+                    ) + v.commands,
+                    lastActive = GREATEST(user_activity.lastActive, v.seen),
+                    workerIndex = %s
+                """,
+                [workerIndex]
+                + [
+                    value
+                    for discordID, (commands, seen) in chunk
+                    for value in (discordID, commands, seen)
+                ]
+                + [ACTIVITY_HALF_LIFE, workerIndex],
+            )
 
-        userID = result[0]
+    await _execute(work, transaction=True)
 
+
+# Fetches the most active users seen since `since` (naive UTC) by a worker,
+# highest decayed score first, with their token and domain
+async def getActiveUsers(
+    since: datetime.datetime, limit: int, workerIndex: int = 0
+) -> List[Dict]:
+    def work(cursor):
         cursor.execute(
             """
-            INSERT INTO reminders (userID, `when`, recurring, content)
-            VALUES (%s, %s, %s, %s)
+            SELECT u.discordID, ct.token, ct.domain
+            FROM user_activity a
+            JOIN users u ON u.userID = a.userID
+            JOIN canvas_token ct ON ct.userID = a.userID
+            WHERE a.workerIndex = %s AND a.lastActive >= %s
+            ORDER BY a.score * POW(
+                0.5, TIMESTAMPDIFF(SECOND, a.lastActive, UTC_TIMESTAMP()) / %s
+            ) DESC
+            LIMIT %s
             """,
-            (userID, when, recurring, content),
+            (workerIndex, since, ACTIVITY_HALF_LIFE, limit),
         )
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
+        return cursor.fetchall()
 
+    return await _execute(work, dictionary=True)
 
-# Completely deletes a user and their associated data (for logout or account reset)
-async def deleteUser(discordID: int):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
 
-        # Get the internal userID
-        cursor.execute("SELECT userID FROM users WHERE discordID = %s", (discordID,))
-        result = cursor.fetchone()
-        if not result:
-            return  # User not found
+# Replaces the stored course enrollments of `discordIDs` with `rows` of
+# (discordID, domain, classID, className), so every bot process can see who is
+# enrolled where without asking Canvas
+async def replaceEnrollments(
+    discordIDs: List[int], rows: List[Tuple[int, str, int, str]]
+):
+    if not discordIDs:
+        return
 
-        userID = result[0]
+    def work(cursor):
+        for start in range(0, len(discordIDs), BULK_CHUNK):
+            chunk = discordIDs[start : start + BULK_CHUNK]
+            cursor.execute(
+                f"""
+                DELETE e FROM course_enrollments e
+                JOIN users u ON u.userID = e.userID
+                WHERE u.discordID IN ({', '.join(['%s'] * len(chunk))})
+                """,
+                chunk,
+            )
+        for start in range(0, len(rows), BULK_CHUNK):
+            chunk = rows[start : start + BULK_CHUNK]
+            derived = " UNION ALL ".join(
+                [
+                    "SELECT %s AS discordID, %s AS domain, %s AS classID, "
+                    "%s AS className"
+                ]
+                + ["SELECT %s, %s, %s, %s"] * (len(chunk) - 1)
+            )
+            cursor.execute(
+                f"""
+                INSERT IGNORE INTO course_enrollments
+                    (userID, domain, classID, className)
+                SELECT u.userID, v.domain, v.classID, v.className
+                FROM ({derived}) v
+                JOIN users u ON u.discordID = v.discordID
+                """,
+                [value for row in chunk for value in row],
+            )
 
-        # Delete related records using userID
-        cursor.execute("DELETE FROM reminders WHERE userID = %s", (userID,))
-        cursor.execute("DELETE FROM configurations WHERE userID = %s", (userID,))
-        cursor.execute("DELETE FROM canvas_token WHERE userID = %s", (userID,))
+    await _execute(work, transaction=True)
 
-        # Delete from users table using discordID
-        cursor.execute("DELETE FROM users WHERE discordID = %s", (discordID,))
 
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
+# Reads every stored course enrollment
+async def getEnrollments() -> List[Dict]:
+    def work(cursor):
+        cursor.execute(
+            """
+            SELECT u.discordID, e.domain, e.classID, e.className
+            FROM course_enrollments e
+            JOIN users u ON u.userID = e.userID
+            """
+        )
+        return cursor.fetchall()
+
+    return await _execute(work, dictionary=True)
+
+
+# Reads the stored high-water marks for the given keys (naive UTC datetimes)
+async def getWatermarks(keys: List[str]) -> Dict[str, datetime.datetime]:
+    if not keys:
+        return {}
+
+    def work(cursor):
+        cursor.execute(
+            f"""
+            SELECT watermarkKey, mark FROM watermarks
+            WHERE watermarkKey IN ({', '.join(['%s'] * len(keys))})
+            """,
+            keys,
+        )
+        return {key: mark for key, mark in cursor.fetchall()}
+
+    return await _execute(work)
+
+
+# Inserts or advances high-water marks
+async def setWatermarks(marks: Dict[str, datetime.datetime]):
+    if not marks:
+        return
+
+    def work(cursor):
+        cursor.executemany(
+            """
+            INSERT INTO watermarks (watermarkKey, mark) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE mark = GREATEST(mark, VALUES(mark))
+            """,
+            list(marks.items()),
+        )
+
+    await _execute(work)
+
+
+# Stores the last seen due date (naive UTC) of assignments, kept beside the
+# watermarks. Unlike setWatermarks a due date may move back, so rows are replaced.
+async def setDueDates(dues: Dict[str, datetime.datetime]):
+    if not dues:
+        return
+
+    def work(cursor):
+        cursor.executemany(
+            """
+            INSERT INTO watermarks (watermarkKey, mark) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE mark = VALUES(mark)
+            """,
+            list(dues.items()),
+        )
+
+    await _execute(work)
+
+
+# Removes stored due dates that have passed; `prefix` marks due-date keys
+async def deleteExpiredDueDates(prefix: str):
+    def work(cursor):
+        cursor.execute(
+            """
+            DELETE FROM watermarks
+            WHERE watermarkKey LIKE %s AND mark < UTC_TIMESTAMP()
+            """,
+            (prefix + "%",),
+        )
+
+    await _execute(work)
+
+
+# Reads a stored Canvas page by its hashed cache key
+async def getCachedResponse(cacheKey: str) -> Optional[Dict]:
+    def work(cursor):
+        cursor.execute(
+            """
+            SELECT etag, lastModified, nextURL, body
+            FROM canvas_cache
+            WHERE cacheKey = %s
+            """,
+            (cacheKey,),
+        )
+        return cursor.fetchone()
+
+    return await _execute(work, dictionary=True)
+
+
+# Stores or replaces a Canvas page and its validators
+async def saveCachedResponse(
+    cacheKey: str,
+    etag: Optional[str],
+    lastModified: Optional[str],
+    nextURL: Optional[str],
+    body: str,
+):
+    def work(cursor):
+        cursor.execute(
+            """
+            INSERT INTO canvas_cache
+                (cacheKey, etag, lastModified, nextURL, body, fetchedAt)
+            VALUES (%s, %s, %s, %s, %s, UTC_TIMESTAMP())
+            ON DUPLICATE KEY UPDATE
+                etag = VALUES(etag),
+                lastModified = VALUES(lastModified),
+                nextURL = VALUES(nextURL),
+                body = VALUES(body),
+                fetchedAt = VALUES(fetchedAt)
+            """,
+            (cacheKey, etag, lastModified, nextURL, body),
+        )
+
+    await _execute(work)
@@ -0,0 +1,187 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import time
+import courseCache
+import databaseFunctions
+from canvasRecords import Assignment, Course
+from canvasScheduler import backgroundPriority
+from classListCache import getClassListCached
+from ttlCache import TTLCache
+
+# How often the background refresh brings every index up to date
+REFRESH_INTERVAL = 300
+# Indexes of users who haven't run /calendar for this long are dropped
+INDEX_IDLE_TTL = 3600
+# Users refreshed at the same time
+MAX_CONCURRENT_REFRESHES = 4
+
+
+class DeadlineIndex:
+    """
+    One user's upcoming assignments across all their courses, kept as
+    parallel sorted arrays of due timestamps and records, so a due-date range
+    is two bisects and a slice. Each course is also indexed on its own for
+    single-class queries. Courses are replaced one at a time as they refresh.
+    """
+
+    def __init__(self):
+        self._courses: Dict[int, Tuple[List[int], List[Assignment], float]] = {}
+        self._dues: List[int] = []
+        self._items: List[Assignment] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # Oldest refresh time (epoch seconds) of any course in the index
+    @property
+    def refreshedAt(self) -> Optional[float]:
+        if not self._courses:
+            return None
+        return min(refreshed for _, _, refreshed in self._courses.values())
+
+    # Replaces one course's assignments, which must be sorted by due date
+    def updateCourse(self, courseID: int, assignments: List[Assignment]):
+        previous = self._courses.get(courseID)
+        dues = [a.due for a in assignments]
+        self._courses[courseID] = (dues, list(assignments), time.time())
+        # Unchanged courses only need their refresh time bumped
+        if previous is None or previous[0] != dues or previous[1] != assignments:
+            self._rebuild()
+
+    # Drops courses the user is no longer enrolled in
+    def retainCourses(self, courseIDs: List[int]):
+        stale = set(self._courses) - set(courseIDs)
+        for courseID in stale:
+            del self._courses[courseID]
+        if stale:
+            self._rebuild()
+
+    def _rebuild(self):
+        # Every course list is already sorted, so a k-way merge keeps the order
+        self._items = list(
+            heapq.merge(*(items for _, items, _ in self._courses.values()), key=_due)
+        )
+        self._dues = [a.due for a in self._items]
+
+    # Returns assignments due in [start, end), optionally for a single course
+    def range(
+        self, start: int, end: int, courseID: Optional[int] = None
+    ) -> List[Assignment]:
+        if courseID is None:
+            dues, items = self._dues, self._items
+        elif courseID in self._courses:
+            dues, items, _ = self._courses[courseID]
+        else:
+            return []
+        return items[bisect_left(dues, start) : bisect_left(dues, end)]
+
+
+def _due(assignment: Assignment) -> int:
+    return assignment.due
+
+
+# Indexes keyed by Discord user ID
+_indexes = TTLCache(maxsize=4096, ttl=INDEX_IDLE_TTL)
+
+
+# Loads every course's assignments from the shared course cache into `index`
+async def _refresh(
+    index: DeadlineIndex,
+    discordID: int,
+    canvas_token: str,
+    canvas_domain: str,
+    classes: List[Course],
+):
+    per_course = await asyncio.gather(
+        *(
+            courseCache.getAssignments(
+                discordID, canvas_token, canvas_domain, course.id, course.name
+            )
+            for course in classes
+        ),
+        return_exceptions=True,
+    )
+    for course, assignments in zip(classes, per_course):
+        # A failed course keeps its previous entries until the next refresh
+        if not isinstance(assignments, BaseException):
+            index.updateCourse(course.id, assignments)
+    index.retainCourses([course.id for course in classes])
+
+
+# Returns the user's deadline index, building it on first use
+async def getIndex(
+    discordID: int, canvas_token: str, canvas_domain: str
+) -> DeadlineIndex:
+    async def build() -> DeadlineIndex:
+        index = DeadlineIndex()
+        classes = await getClassListCached(discordID, canvas_token, canvas_domain)
+        await _refresh(index, discordID, canvas_token, canvas_domain, classes)
+        return index
+
+    index = await _indexes.getOrLoad(discordID, build)
+    # Reading an index keeps it alive for another INDEX_IDLE_TTL
+    _indexes.set(discordID, index)
+    return index
+
+
+# Index cache (hits, misses), for the metrics endpoint
+def cacheStats() -> Tuple[int, int]:
+    return _indexes.stats()
+
+
+# Forgets a user's index, e.g. after /logout
+def dropUser(discordID: int):
+    _indexes.pop(discordID)
+
+
+class DeadlineRefresher:
+    """
+    Refreshes every live deadline index in the background, so /calendar
+    answers from memory. Course data comes from the shared course cache, so
+    classmates' indexes reuse the same Canvas requests.
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL):
+        self.interval = interval
+        self._limit = asyncio.Semaphore(MAX_CONCURRENT_REFRESHES)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        with backgroundPriority():
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.refreshAll()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Error refreshing deadline indexes: {e}")
+
+    async def refreshAll(self):
+        await asyncio.gather(
+            *(self._refreshUser(discordID) for discordID in _indexes.keys()),
+            return_exceptions=True,
+        )
+
+    async def _refreshUser(self, discordID: int):
+        async with self._limit:
+            # get() doesn't extend the TTL, so idle users still expire
+            index = _indexes.get(discordID)
+            token_data = await databaseFunctions.getCanvasToken(discordID)
+            if index is None or not token_data:
+                dropUser(discordID)
+                return
+            canvas_token, canvas_domain = token_data
+            classes = await getClassListCached(discordID, canvas_token, canvas_domain)
+            await _refresh(index, discordID, canvas_token, canvas_domain, classes)
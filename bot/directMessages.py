@@ -0,0 +1,52 @@
+from typing import Optional
+import asyncio
+import discord
+
+# Concurrent DM sends, and minimum spacing between starting them
+MAX_CONCURRENT_SENDS = 5
+SEND_INTERVAL = 0.2
+MAX_ATTEMPTS = 3
+
+
+class DirectMessenger:
+    """
+    Sends DMs for background jobs (reminders, notifications) through one
+    shared, paced queue so bursts don't trip Discord's rate limits.
+    """
+
+    def __init__(self, client: discord.Client):
+        self.client = client
+        self.sent = 0
+        self.failed = 0
+        self._limit = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+        self._pace = asyncio.Lock()
+
+    # Sends `content` to a user, returns True if it was delivered
+    async def send(
+        self,
+        discordID: int,
+        content: Optional[str] = None,
+        embed: Optional[discord.Embed] = None,
+    ) -> bool:
+        async with self._limit:
+            # Space out DM starts so bursts are spread over time
+            async with self._pace:
+                await asyncio.sleep(SEND_INTERVAL)
+            for _ in range(MAX_ATTEMPTS):
+                try:
+                    user = self.client.get_user(
+                        discordID
+                    ) or await self.client.fetch_user(discordID)
+                    await user.send(content, embed=embed)
+                    self.sent += 1
+                    return True
+                except discord.Forbidden:
+                    # The user has DMs closed, nothing to retry
+                    break
+                except discord.HTTPException as e:
+                    if e.status != 429:
+                        break
+                    retry_after = getattr(e, "retry_after", None) or 5
+                    await asyncio.sleep(retry_after)
+            self.failed += 1
+            return False
@@ -0,0 +1,141 @@
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterator, List, Tuple
+import hashlib
+import tempfile
+import courseCache
+from canvasRecords import Assignment, Course
+from ttlCache import TTLCache
+
+# Bytes yielded at a time while streaming a calendar
+CHUNK_SIZE = 16 * 1024
+# Exports larger than this are spooled to disk instead of kept in memory
+SPOOL_BYTES = 1024 * 1024
+
+# Serialized VEVENT blocks keyed by (domain, course ID), with a signature of
+# the assignments they were built from so unchanged courses are reused as-is
+_course_blocks = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+
+_HEADER = (
+    "BEGIN:VCALENDAR\r\n"
+    "VERSION:2.0\r\n"
+    "PRODID:-//CanvasCord//Canvas assignments//EN\r\n"
+    "CALSCALE:GREGORIAN\r\n"
+    "X-WR-CALNAME:Canvas assignments\r\n"
+).encode()
+_FOOTER = b"END:VCALENDAR\r\n"
+
+
+# Escapes TEXT values as RFC 5545 requires
+def _escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+# Folds a content line at 75 octets, continuation lines start with a space
+def _fold(line: str) -> str:
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _icsTime(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _event(assignment: Assignment, domain: str) -> str:
+    # Stamped with the assignment's own update time so output is deterministic
+    stamp = _icsTime(assignment.updated or assignment.due)
+    due = _icsTime(assignment.due)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:assignment-{assignment.id}@{domain}",
+        f"DTSTAMP:{stamp}",
+        # Without DTEND the event takes no time (RFC 5545 3.6.1); a DTEND equal
+        # to DTSTART is invalid
+        f"DTSTART:{due}",
+        f"SUMMARY:{_escape(assignment.title)}",
+        f"CATEGORIES:{_escape(assignment.course_name)}",
+        f"DESCRIPTION:{_escape(assignment.course_name)}",
+    ]
+    if assignment.url:
+        lines.append(f"URL:{assignment.url}")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+def _signature(assignments: List[Assignment]) -> str:
+    digest = hashlib.sha256()
+    for a in assignments:
+        digest.update(f"{a.id}|{a.due}|{a.updated}|{a.title}|{a.url}\n".encode())
+    return digest.hexdigest()
+
+
+# Returns a course's serialized events, re-serializing only if it changed
+def _courseBlock(domain: str, courseID: int, assignments: List[Assignment]) -> bytes:
+    signature = _signature(assignments)
+    cached = _course_blocks.get((domain, courseID))
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    block = "".join(_event(a, domain) for a in assignments).encode()
+    _course_blocks.set((domain, courseID), (signature, block))
+    return block
+
+
+def _chunks(data: bytes) -> Iterator[bytes]:
+    view = memoryview(data)
+    for start in range(0, len(view), CHUNK_SIZE):
+        yield bytes(view[start : start + CHUNK_SIZE])
+
+
+# Streams an iCalendar feed of the user's upcoming assignments
+async def streamCalendar(
+    discordID: int, canvas_token: str, canvas_domain: str, classes: List[Course]
+) -> AsyncIterator[bytes]:
+    """
+    Yield the feed in chunks of at most CHUNK_SIZE bytes, one course at a
+    time, so the whole calendar is never held in memory. Assignments come
+    from the shared course cache (the next 90 days, as in /calendar).
+    Suitable for writing to a file or an HTTP response.
+    """
+    yield _HEADER
+    for course in classes:
+        assignments = await courseCache.getAssignments(
+            discordID, canvas_token, canvas_domain, course.id, course.name
+        )
+        for chunk in _chunks(_courseBlock(canvas_domain, course.id, assignments)):
+            yield chunk
+    yield _FOOTER
+
+
+# Writes the feed to a temporary file, returned rewound, along with its size
+async def exportCalendar(
+    discordID: int, canvas_token: str, canvas_domain: str, classes: List[Course]
+) -> Tuple[tempfile.SpooledTemporaryFile, int]:
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    size = 0
+    try:
+        async for chunk in streamCalendar(
+            discordID, canvas_token, canvas_domain, classes
+        ):
+            output.write(chunk)
+            size += len(chunk)
+    except BaseException:
+        output.close()
+        raise
+    output.seek(0)
+    return output, size
@@ -0,0 +1,72 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import asyncio
+import time
+import metrics
+
+# How often the monitor checks in, finer intervals catch shorter stalls
+SAMPLE_INTERVAL = 0.05
+# Samples kept, enough to cover a deferred interaction's 15 minute lifetime
+HISTORY = 20000
+# Commands that blocked the loop for longer than this in total are logged
+REPORT_THRESHOLD = 0.1
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes a task that sleeps for a fixed
+    interval; the extra time is time the loop spent blocked. Samples are
+    timestamped so the lag seen while a command ran can be reported when it
+    completes, and totals are kept per command name.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.worst = 0.0
+        self.commands: Dict[str, Dict[str, float]] = {}
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=HISTORY)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - before - self.interval, 0.0)
+            metrics.loop_lag_seconds.observe(lag)
+            if lag:
+                self._samples.append((time.time(), lag))
+                self.worst = max(self.worst, lag)
+
+    # Returns the (longest, total) lag observed since a wall-clock timestamp
+    def lagSince(self, since: float) -> Tuple[float, float]:
+        longest = total = 0.0
+        for stamp, lag in reversed(self._samples):
+            if stamp < since:
+                break
+            longest = max(longest, lag)
+            total += lag
+        return longest, total
+
+    # Records the lag seen while a command ran and logs it if it was large
+    def recordCommand(self, name: str, startedAt: float):
+        longest, total = self.lagSince(startedAt)
+        stats = self.commands.setdefault(
+            name, {"count": 0, "total": 0.0, "worst": 0.0}
+        )
+        stats["count"] += 1
+        stats["total"] += total
+        stats["worst"] = max(stats["worst"], longest)
+        if total >= REPORT_THRESHOLD:
+            print(
+                f"/{name}: event loop blocked {total * 1000:.0f} ms "
+                f"(longest stall {longest * 1000:.0f} ms)"
+            )
@@ -0,0 +1,349 @@
+"""
+In-process metrics: counters, latency histograms and gauges, exported as
+Prometheus text on a local HTTP endpoint and, if METRICS_LOG_PATH is set, as
+JSON lines per command.
+
+Slash command timings are broken into phases (token lookup, Canvas HTTP,
+parsing, Discord send). The command being served is tracked in a context
+variable, so phases timed anywhere below a command are attributed to it.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+
+# Where the Prometheus endpoint listens, local only
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+# File of JSON lines with one record per finished command; None turns the
+# log off. Lines are written by a background thread, never on the event loop.
+METRICS_LOG_PATH: Optional[str] = None
+# Share of autocomplete requests logged, as there is one per keystroke
+AUTOCOMPLETE_LOG_SAMPLE = 0.01
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labelText(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in self._values.items():
+                lines.append(f"{self.name}{_labelText(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [
+                (labels, list(counts), total[0])
+                for labels, (counts, total) in self._series.items()
+            ]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                label_text = _labelText(self.labels, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _labelText(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A value read from a callback each time metrics are scraped."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = float(self.read())
+        except Exception:
+            return []
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {value}",
+        ]
+
+
+_registry: Dict[str, object] = {}
+
+
+def _register(metric):
+    _registry[metric.name] = metric
+    return metric
+
+
+def gauge(name: str, help: str, read: Callable[[], float]) -> Gauge:
+    return _register(Gauge(name, help, read))
+
+
+# Exposes a cache's hits and misses, read through `stats()` as (hits, misses),
+# plus its hit ratio
+def registerCache(name: str, stats: Callable[[], Tuple[int, int]]):
+    def ratio() -> float:
+        hits, misses = stats()
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    gauge(f"canvascord_cache_{name}_hits", f"{name} cache hits", lambda: stats()[0])
+    gauge(
+        f"canvascord_cache_{name}_misses", f"{name} cache misses", lambda: stats()[1]
+    )
+    gauge(f"canvascord_cache_{name}_hit_ratio", f"{name} cache hit ratio", ratio)
+
+
+# Prometheus text exposition of every registered metric
+def render() -> str:
+    lines: List[str] = []
+    for metric in list(_registry.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+command_seconds = _register(
+    Histogram(
+        "canvascord_command_seconds",
+        "Slash command and autocomplete latency, from interaction creation",
+        ("command",),
+    )
+)
+phase_seconds = _register(
+    Histogram(
+        "canvascord_phase_seconds",
+        "Time spent per phase while serving a command",
+        ("command", "phase"),
+    )
+)
+canvas_request_seconds = _register(
+    Histogram(
+        "canvascord_canvas_request_seconds",
+        "Canvas HTTP request latency per endpoint",
+        ("endpoint", "status"),
+    )
+)
+db_pool_wait_seconds = _register(
+    Histogram(
+        "canvascord_db_pool_wait_seconds",
+        "Time database work waited for a pooled connection",
+    )
+)
+loop_lag_seconds = _register(
+    Histogram(
+        "canvascord_loop_lag_seconds",
+        "How late the event loop woke the lag monitor",
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+    )
+)
+commands_total = _register(
+    Counter("canvascord_commands_total", "Commands finished", ("command",))
+)
+
+
+class _CommandTiming:
+    __slots__ = ("command", "started", "phases")
+
+    def __init__(self, command: str, started: float):
+        self.command = command
+        self.started = started
+        self.phases: Dict[str, float] = {}
+
+
+# The command the current task is serving, if any
+_current: ContextVar[Optional[_CommandTiming]] = ContextVar(
+    "canvascord_command", default=None
+)
+# Timings by interaction ID until the command finishes
+_open: Dict[int, _CommandTiming] = {}
+# Commands that never report back are dropped after this long
+_OPEN_TIMEOUT = 15 * 60
+
+
+# Marks the current task as serving `command`; `started` is a wall-clock time
+def beginCommand(interactionID: int, command: str, started: float):
+    now = time.time()
+    for key in [k for k, t in _open.items() if now - t.started > _OPEN_TIMEOUT]:
+        del _open[key]
+    timing = _CommandTiming(command, started)
+    _open[interactionID] = timing
+    _current.set(timing)
+
+
+# Records a finished command's latency and writes its structured log line
+def finishCommand(interactionID: int):
+    timing = _open.pop(interactionID, None)
+    if timing is None:
+        return
+    elapsed = max(time.time() - timing.started, 0.0)
+    command_seconds.observe(elapsed, timing.command)
+    commands_total.inc(timing.command)
+    if METRICS_LOG_PATH is None:
+        return
+    if timing.command.endswith(":autocomplete"):
+        if random.random() >= AUTOCOMPLETE_LOG_SAMPLE:
+            return
+    _log(
+        {
+            "event": "command",
+            "command": timing.command,
+            "seconds": round(elapsed, 4),
+            "phases": {k: round(v, 4) for k, v in timing.phases.items()},
+        }
+    )
+
+
+def currentCommand() -> str:
+    timing = _current.get()
+    return timing.command if timing is not None else "background"
+
+
+# Times a block as one phase of the command being served
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timing = _current.get()
+        command = timing.command if timing is not None else "background"
+        phase_seconds.observe(elapsed, command, name)
+        if timing is not None:
+            timing.phases[name] = timing.phases.get(name, 0.0) + elapsed
+
+
+_ID_SEGMENT = re.compile(r"/(\d+|sis_[^/]+)(?=/|$)")
+
+
+# Reduces a Canvas URL to a low-cardinality endpoint label
+def endpointLabel(url: str) -> str:
+    path = url.split("?", 1)[0]
+    if "://" in path:
+        path = "/" + path.split("://", 1)[1].split("/", 1)[-1]
+    return _ID_SEGMENT.sub("/:id", path)
+
+
+_logger = logging.getLogger("canvascord.metrics")
+_logger.propagate = False
+_log_listener: Optional[QueueListener] = None
+
+
+# Hands the record to a queue drained by a thread that owns the log file
+def _log(record: Dict):
+    global _log_listener
+    if _log_listener is None:
+        try:
+            handler = logging.FileHandler(METRICS_LOG_PATH, delay=True)
+        except OSError as e:
+            print(f"Error opening metrics log: {e}")
+            return
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        _log_listener = QueueListener(records, handler)
+        _log_listener.start()
+        _logger.addHandler(QueueHandler(records))
+        _logger.setLevel(logging.INFO)
+    record["ts"] = round(time.time(), 3)
+    _logger.info(json.dumps(record, separators=(",", ":")))
+
+
+# Writes out queued log lines and closes the log file
+def closeLog():
+    global _log_listener
+    if _log_listener is None:
+        return
+    _log_listener.stop()
+    for handler in _log_listener.handlers:
+        handler.close()
+    _logger.handlers.clear()
+    _log_listener = None
+
+
+# Serves render() at http://METRICS_HOST:METRICS_PORT/metrics
+async def startServer(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Returns the aiohttp AppRunner; call its cleanup() to stop serving."""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
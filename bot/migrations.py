@@ -0,0 +1,166 @@
+"""
+Applies the versioned schema migrations in database/migrations and checks
+that the hot queries in databaseFunctions are served by an index.
+
+Usage (from the bot directory):
+    python migrations.py            apply pending migrations, then check plans
+    python migrations.py --check    only check query plans
+    python migrations.py --lenient  only fail on full scans with no usable
+                                    index, e.g. on a nearly empty database
+"""
+
+from datetime import datetime
+from typing import Dict, List, Tuple
+import importlib.util
+import os
+import re
+import sys
+import databaseFunctions
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "database", "migrations"
+)
+
+# Hot queries and representative parameters for EXPLAIN
+HOT_QUERIES = {
+    "getCanvasToken": (databaseFunctions.CANVAS_TOKEN_QUERY, (0,)),
+    "getNotificationSettings": (databaseFunctions.NOTIFICATION_SETTINGS_QUERY, (0,)),
+    "getReminders": (databaseFunctions.REMINDERS_QUERY, (0,)),
+    "getUpcomingReminders": (
+        databaseFunctions.UPCOMING_REMINDERS_QUERY,
+        (
+            datetime(2100, 1, 1),
+            datetime(1970, 1, 1),
+            datetime(1970, 1, 1),
+            0,
+            1,
+            0,
+            100,
+        ),
+    ),
+}
+
+
+# Returns (version, name, path) for every migration file, in order
+# Migrations are .sql scripts, or .py modules with an upgrade(cursor) function
+# for changes that depend on the live schema
+def _migrationFiles() -> List[Tuple[int, str, str]]:
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r"(\d+)_(.+)\.(sql|py)$", filename)
+        if match:
+            migrations.append(
+                (
+                    int(match.group(1)),
+                    os.path.splitext(filename)[0],
+                    os.path.join(MIGRATIONS_DIR, filename),
+                )
+            )
+    return migrations
+
+
+# Runs one migration file on the given cursor
+def _apply(cursor, name: str, path: str):
+    if path.endswith(".py"):
+        spec = importlib.util.spec_from_file_location(f"migration_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(cursor)
+        return
+    with open(path) as f:
+        for statement in _statements(f.read()):
+            cursor.execute(statement)
+
+
+# Splits a migration file into statements, dropping comment lines
+def _statements(sql: str) -> List[str]:
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+def migrate() -> List[str]:
+    """
+    Apply every migration newer than the recorded schema version.
+    A MySQL named lock keeps two bot processes from migrating at once.
+    Returns the names of the migrations applied.
+    """
+    applied = []
+    conn = databaseFunctions.get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK('canvascord_migrations', 60)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Another process is running migrations.")
+
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS Schema_Migrations (
+                Version INT PRIMARY KEY,
+                Name VARCHAR(255) NOT NULL,
+                AppliedAt DATETIME NOT NULL
+            )
+            """
+        )
+        cursor.execute("SELECT COALESCE(MAX(Version), 0) FROM Schema_Migrations")
+        current = cursor.fetchone()[0]
+
+        for version, name, path in _migrationFiles():
+            if version <= current:
+                continue
+            _apply(cursor, name, path)
+            cursor.execute(
+                """
+                INSERT INTO Schema_Migrations (Version, Name, AppliedAt)
+                VALUES (%s, %s, UTC_TIMESTAMP())
+                """,
+                (version, name),
+            )
+            conn.commit()
+            applied.append(name)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('canvascord_migrations')")
+        cursor.fetchall()
+        cursor.close()
+        conn.close()
+    return applied
+
+
+def checkQueryPlans(lenient: bool = False) -> Dict[str, List[str]]:
+    """
+    EXPLAIN every hot query and report tables read with a full scan, i.e.
+    without an index (key is NULL). With `lenient` a full scan is let through
+    when the table has a usable index the optimizer skipped, which it does
+    for tiny tables.
+    Returns {query name: [problem, ...]} for the queries with problems.
+    """
+    problems: Dict[str, List[str]] = {}
+    conn = databaseFunctions.get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for name, (sql, params) in HOT_QUERIES.items():
+            cursor.execute("EXPLAIN " + sql, params)
+            for row in cursor.fetchall():
+                if row.get("type") != "ALL" or row.get("key") is not None:
+                    continue
+                if not lenient or not row.get("possible_keys"):
+                    problems.setdefault(name, []).append(
+                        f"full scan of {row.get('table')} "
+                        f"(possible keys: {row.get('possible_keys')})"
+                    )
+    finally:
+        cursor.close()
+        conn.close()
+    return problems
+
+
+if __name__ == "__main__":
+    if "--check" not in sys.argv:
+        for name in migrate():
+            print(f"Applied {name}")
+    problems = checkQueryPlans(lenient="--lenient" in sys.argv)
+    for name, issues in problems.items():
+        for issue in issues:
+            print(f"{name}: {issue}")
+    if problems:
+        sys.exit(1)
+    print("All hot queries use an index.")
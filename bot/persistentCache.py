@@ -0,0 +1,34 @@
+from typing import Optional
+import hashlib
+import databaseFunctions
+from canvasClient import StoredResponse
+
+
+class MySQLResponseStore:
+    """
+    Keeps Canvas pages in the Canvas_Cache table so that after a restart, or
+    once the in-memory caches expire, pages are revalidated with a
+    conditional request instead of being downloaded again.
+    """
+
+    # Cache keys include full URLs, so they are hashed to a fixed length
+    @staticmethod
+    def _hash(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    async def load(self, key: str) -> Optional[StoredResponse]:
+        row = await databaseFunctions.getCachedResponse(self._hash(key))
+        if not row:
+            return None
+        return StoredResponse(
+            row["etag"], row["lastModified"], row["body"], row["nextURL"]
+        )
+
+    async def save(self, key: str, stored: StoredResponse):
+        await databaseFunctions.saveCachedResponse(
+            self._hash(key),
+            stored.etag,
+            stored.last_modified,
+            stored.next_url,
+            stored.body,
+        )
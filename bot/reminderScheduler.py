@@ -0,0 +1,225 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import databaseFunctions
+from directMessages import DirectMessenger
+from sharding import ShardConfig
+
+# Reminders are loaded from the database this far ahead of time
+LOAD_WINDOW = timedelta(minutes=10)
+# Maximum rows read per query, a load pages through its window
+LOAD_LIMIT = 5000
+
+RECURRENCE = {"daily": timedelta(days=1), "weekly": timedelta(weeks=1)}
+
+# Every load starts here, so overdue reminders not yet claimed still fire
+_EPOCH = datetime(1970, 1, 1)
+
+
+class ScheduledReminder:
+    __slots__ = ("reminderID", "discordID", "when", "recurring", "content")
+
+    def __init__(
+        self,
+        reminderID: int,
+        discordID: int,
+        when: datetime,
+        recurring: Optional[str],
+        content: str,
+    ):
+        self.reminderID = reminderID
+        self.discordID = discordID
+        self.when = when
+        self.recurring = recurring
+        self.content = content
+
+
+# Returns the first occurrence of a recurring reminder after `now`
+def nextOccurrence(when: datetime, recurring: str, now: datetime) -> datetime:
+    step = RECURRENCE[recurring]
+    if when > now:
+        return when
+    # Skip every occurrence missed while the bot was offline in one step
+    missed = (now - when) // step + 1
+    return when + step * missed
+
+
+class ReminderScheduler:
+    """
+    Sends reminder DMs at their fire time through a shared DirectMessenger.
+    Reminders are kept in a min-heap ordered by (when, reminderID), so
+    inserts are O(log n). Every load reads all unclaimed reminders due before
+    a horizon LOAD_WINDOW ahead, and skips the ones already held. Fired
+    reminders are deleted or moved, so the table is never read in full.
+    Because each load re-reads the whole window, a reminder inserted behind
+    an earlier load is picked up by the next one.
+
+    In a sharded deployment each process loads only the reminders of the
+    users it owns. A reminder created on another process is also scheduled
+    there, so it can be held twice. Whichever copy fires first claims the
+    database row and the other is dropped, and the same goes for a reminder
+    a load reads again while its send is still under way.
+    """
+
+    def __init__(
+        self, messenger: DirectMessenger, shard: Optional[ShardConfig] = None
+    ):
+        self.messenger = messenger
+        self.shard = shard or ShardConfig()
+        self._heap: List[Tuple[datetime, int]] = []
+        self._entries: Dict[int, ScheduledReminder] = {}
+        self._horizon = _EPOCH
+        self._reload = False
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._sends: Set[asyncio.Task] = set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._sends):
+            task.cancel()
+
+    # Number of reminders currently held in memory
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Returns true if a reminder firing at `when` should be held now rather
+    # than left to a later load
+    def _inWindow(self, when: datetime) -> bool:
+        return when < datetime.now() + LOAD_WINDOW
+
+    def _push(self, reminder: ScheduledReminder):
+        if reminder.reminderID in self._entries:
+            return
+        self._entries[reminder.reminderID] = reminder
+        heapq.heappush(self._heap, (reminder.when, reminder.reminderID))
+        # Wake the loop if this is now the earliest reminder
+        if self._heap[0][1] == reminder.reminderID:
+            self._wake.set()
+
+    # Called after a reminder is written so it fires without waiting for a load
+    def schedule(
+        self,
+        reminderID: int,
+        discordID: int,
+        when: datetime,
+        recurring: Optional[str],
+        content: str,
+    ):
+        if self._inWindow(when):
+            self._push(
+                ScheduledReminder(reminderID, discordID, when, recurring, content)
+            )
+
+    # Loads right away, e.g. after databaseFunctions.addReminders inserted
+    # reminders that are due before the next load
+    def reload(self):
+        self._reload = True
+        self._wake.set()
+
+    # Drops every in-memory reminder for a user, e.g. after /logout. Sends
+    # already under way are stopped by their claim failing on the deleted row.
+    def cancelUser(self, discordID: int):
+        for reminderID, reminder in list(self._entries.items()):
+            if reminder.discordID == discordID:
+                # Heap entries without a matching _entries item are skipped
+                del self._entries[reminderID]
+
+    # Reads every unclaimed reminder due before the new horizon into the heap
+    async def _load(self):
+        horizon = datetime.now() + LOAD_WINDOW
+        after: Tuple[datetime, int] = (_EPOCH, 0)
+        while True:
+            rows = await databaseFunctions.getUpcomingReminders(
+                after[0],
+                after[1],
+                horizon,
+                LOAD_LIMIT,
+                self.shard.workerIndex,
+                self.shard.workerCount,
+            )
+            for row in rows:
+                self._push(
+                    ScheduledReminder(
+                        row["reminderID"],
+                        int(row["discordID"]),
+                        row["when"],
+                        row["recurring"],
+                        row["content"],
+                    )
+                )
+            if len(rows) < LOAD_LIMIT:
+                break
+            # Page truncated, continue after its last row
+            after = (rows[-1]["when"], rows[-1]["reminderID"])
+        self._horizon = horizon
+
+    async def _run(self):
+        while True:
+            try:
+                now = datetime.now()
+                if self._reload or now >= self._horizon - LOAD_WINDOW / 2:
+                    # Cleared first, so a reload asked for mid-load loads again
+                    self._reload = False
+                    await self._load()
+                    now = datetime.now()
+
+                while self._heap and self._heap[0][0] <= now:
+                    _, reminderID = heapq.heappop(self._heap)
+                    reminder = self._entries.pop(reminderID, None)
+                    if reminder is not None:
+                        task = asyncio.create_task(self._fire(reminder))
+                        self._sends.add(task)
+                        task.add_done_callback(self._sends.discard)
+
+                # Sleep until the next reminder or the next load, whichever is first
+                wake_at = self._horizon - LOAD_WINDOW / 2
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                timeout = max((wake_at - datetime.now()).total_seconds(), 0)
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in reminder scheduler: {e}")
+                await asyncio.sleep(30)
+
+    # Claims one reminder by deleting it or moving it to its next occurrence,
+    # then sends it. A failed claim means another process already sent it or
+    # the user logged out, so nothing is sent.
+    async def _fire(self, reminder: ScheduledReminder):
+        try:
+            if reminder.recurring in RECURRENCE:
+                next_when = nextOccurrence(
+                    reminder.when, reminder.recurring, datetime.now()
+                )
+                claimed = await databaseFunctions.rescheduleReminder(
+                    reminder.reminderID, reminder.when, next_when
+                )
+            else:
+                claimed = await databaseFunctions.deleteReminder(
+                    reminder.reminderID, reminder.when
+                )
+        except Exception as e:
+            print(f"Error updating reminder {reminder.reminderID}: {e}")
+            return
+        if not claimed:
+            return
+        await self.messenger.send(
+            reminder.discordID, f"⏰ Reminder: {reminder.content}"
+        )
+        if reminder.recurring in RECURRENCE:
+            reminder.when = next_when
+            if self._inWindow(next_when):
+                self._push(reminder)
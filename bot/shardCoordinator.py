@@ -0,0 +1,157 @@
+"""
+Runs the bot as several processes, each connecting a contiguous range of
+Discord shards. Usage, from bot/:
+    python shardCoordinator.py --processes 4
+    python shardCoordinator.py --processes 4 --shards 16
+
+The shard count defaults to the one Discord recommends for the bot. Each
+process is told its shard range, its share of the background jobs and its
+cache bus peers through environment variables (see sharding.py), is started
+only once the previous one has had time to identify its shards, and is
+restarted if it exits.
+"""
+
+from typing import Dict, List, Tuple
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import aiohttp
+import apiKey
+import sharding
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+# Discord allows max_concurrency shard identifies per this many seconds
+IDENTIFY_INTERVAL = 5
+# Delay before restarting a process that exited, doubled on each quick exit
+RESTART_DELAY = 5
+MAX_RESTART_DELAY = 300
+# A process that stayed up this long resets its restart delay
+HEALTHY_UPTIME = 600
+# First UDP port of the cache bus; process n listens on BUS_PORT + n
+BUS_PORT = 9200
+
+
+# Returns Discord's (recommended shard count, identify max_concurrency)
+async def recommendedShards() -> Tuple[int, int]:
+    headers = {"Authorization": f"Bot {apiKey.botToken}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_URL, headers=headers) as response:
+            response.raise_for_status()
+            data = await response.json()
+    limit = data.get("session_start_limit", {})
+    return data["shards"], limit.get("max_concurrency", 1)
+
+
+# Environment for process `index`, on top of the coordinator's own
+def processEnvironment(
+    index: int, shardIDs: List[int], shardCount: int, processes: int, busPort: int
+) -> Dict[str, str]:
+    env = dict(os.environ)
+    env[sharding.ENV_SHARD_IDS] = ",".join(map(str, shardIDs))
+    env[sharding.ENV_SHARD_COUNT] = str(shardCount)
+    env[sharding.ENV_WORKER_INDEX] = str(index)
+    env[sharding.ENV_WORKER_COUNT] = str(processes)
+    if busPort:
+        env[sharding.ENV_BUS_PORT] = str(busPort + index)
+        env[sharding.ENV_BUS_PEERS] = ",".join(
+            f"127.0.0.1:{busPort + n}" for n in range(processes) if n != index
+        )
+    return env
+
+
+class Coordinator:
+    def __init__(
+        self,
+        ranges: List[List[int]],
+        shardCount: int,
+        concurrency: int,
+        busPort: int,
+    ):
+        self.ranges = ranges
+        self.shardCount = shardCount
+        self.concurrency = concurrency
+        self.busPort = busPort
+        self._processes: Dict[int, asyncio.subprocess.Process] = {}
+        self._stopping = asyncio.Event()
+
+    # Time for a process to identify all of its shards before the next starts
+    def _identifyTime(self, shardIDs: List[int]) -> float:
+        return IDENTIFY_INTERVAL * -(-len(shardIDs) // self.concurrency)
+
+    async def _supervise(self, index: int, startAfter: float):
+        shard_ids = self.ranges[index]
+        env = processEnvironment(
+            index, shard_ids, self.shardCount, len(self.ranges), self.busPort
+        )
+        delay = RESTART_DELAY
+        await asyncio.sleep(startAfter)
+        while not self._stopping.is_set():
+            print(f"Starting worker {index} with shards {shard_ids}")
+            process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                os.path.join(BOT_DIR, "botMain.py"),
+                cwd=BOT_DIR,
+                env=env,
+            )
+            self._processes[index] = process
+            started = asyncio.get_running_loop().time()
+            code = await process.wait()
+            del self._processes[index]
+            if self._stopping.is_set():
+                break
+            uptime = asyncio.get_running_loop().time() - started
+            if uptime >= HEALTHY_UPTIME:
+                delay = RESTART_DELAY
+            else:
+                delay = min(delay * 2, MAX_RESTART_DELAY)
+            print(f"Worker {index} exited with code {code}, restarting in {delay}s")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._stopping.set()
+        for process in self._processes.values():
+            process.terminate()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except NotImplementedError:
+                # Windows has no signal handlers on the event loop
+                pass
+        jobs, start_after = [], 0.0
+        for index, shard_ids in enumerate(self.ranges):
+            jobs.append(self._supervise(index, start_after))
+            start_after += self._identifyTime(shard_ids)
+        await asyncio.gather(*jobs)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run the bot as sharded processes")
+    parser.add_argument("--processes", type=int, required=True)
+    parser.add_argument(
+        "--shards", type=int, help="defaults to Discord's recommendation"
+    )
+    parser.add_argument(
+        "--bus-port", type=int, default=BUS_PORT, help="0 disables the cache bus"
+    )
+    args = parser.parse_args()
+
+    shard_count, concurrency = args.shards, 1
+    if shard_count is None:
+        shard_count, concurrency = await recommendedShards()
+    shard_count = max(shard_count, args.processes)
+    ranges = sharding.splitShards(shard_count, args.processes)
+    print(f"Running {shard_count} shards across {len(ranges)} processes")
+    await Coordinator(ranges, shard_count, concurrency, args.bus_port).run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""
+Sharded deployments: which Discord shards this process connects, and which
+share of the background work (reminders, Canvas polling) it owns.
+
+shardCoordinator.py starts one bot process per shard range and tells each
+one its place through environment variables. Without them the bot runs as a
+single process that owns every shard and every job.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+import os
+import zlib
+
+# Set by shardCoordinator.py for each bot process
+ENV_SHARD_IDS = "CANVASCORD_SHARD_IDS"  # comma separated, e.g. "0,1,2"
+ENV_SHARD_COUNT = "CANVASCORD_SHARD_COUNT"
+ENV_WORKER_INDEX = "CANVASCORD_WORKER_INDEX"
+ENV_WORKER_COUNT = "CANVASCORD_WORKER_COUNT"
+ENV_BUS_PORT = "CANVASCORD_BUS_PORT"
+ENV_BUS_PEERS = "CANVASCORD_BUS_PEERS"  # comma separated host:port
+
+
+# Partition of a Discord user; the same formula is used in SQL, see
+# databaseFunctions.getUpcomingReminders. The low bits of a snowflake are a
+# per-process counter that is usually 0, so the timestamp bits are used.
+def userPartition(discordID: int, partitions: int) -> int:
+    return (discordID >> 22) % partitions
+
+
+# Partition of a Canvas course, stable across processes and restarts
+def coursePartition(domain: str, classID: int, partitions: int) -> int:
+    return zlib.crc32(f"{domain}|{classID}".encode()) % partitions
+
+
+class ShardConfig:
+    """
+    One process's place in the deployment. Discord decides which shard an
+    interaction arrives on, so commands run wherever they land; background
+    jobs are split into `workerCount` partitions by user or course and each
+    process only runs its own.
+    """
+
+    __slots__ = (
+        "shardIDs",
+        "shardCount",
+        "workerIndex",
+        "workerCount",
+        "busPort",
+        "busPeers",
+    )
+
+    def __init__(
+        self,
+        shardIDs: Optional[List[int]] = None,
+        shardCount: Optional[int] = None,
+        workerIndex: int = 0,
+        workerCount: int = 1,
+        busPort: Optional[int] = None,
+        busPeers: Sequence[Tuple[str, int]] = (),
+    ):
+        if not 0 <= workerIndex < workerCount:
+            raise ValueError(f"Worker index {workerIndex} not below {workerCount}")
+        self.shardIDs = shardIDs
+        self.shardCount = shardCount
+        self.workerIndex = workerIndex
+        self.workerCount = workerCount
+        self.busPort = busPort
+        self.busPeers = list(busPeers)
+
+    # The first process also does the once-per-deployment work, e.g. syncing
+    # the command tree
+    @property
+    def primary(self) -> bool:
+        return self.workerIndex == 0
+
+    def ownsUser(self, discordID: int) -> bool:
+        return userPartition(discordID, self.workerCount) == self.workerIndex
+
+    def ownsCourse(self, domain: str, classID: int) -> bool:
+        return coursePartition(domain, classID, self.workerCount) == self.workerIndex
+
+    def describe(self) -> str:
+        if self.workerCount == 1 and self.shardIDs is None:
+            return "single process"
+        shards = ",".join(map(str, self.shardIDs)) if self.shardIDs else "auto"
+        return (
+            f"worker {self.workerIndex + 1}/{self.workerCount}, "
+            f"shards {shards} of {self.shardCount or 'auto'}"
+        )
+
+
+def _parsePeers(value: str) -> List[Tuple[str, int]]:
+    peers = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        host, _, port = item.rpartition(":")
+        peers.append((host or "127.0.0.1", int(port)))
+    return peers
+
+
+# Reads this process's configuration from the variables set by the coordinator
+def fromEnvironment() -> ShardConfig:
+    env = os.environ
+    shard_ids = env.get(ENV_SHARD_IDS)
+    shard_count = env.get(ENV_SHARD_COUNT)
+    bus_port = env.get(ENV_BUS_PORT)
+    return ShardConfig(
+        shardIDs=[int(s) for s in shard_ids.split(",")] if shard_ids else None,
+        shardCount=int(shard_count) if shard_count else None,
+        workerIndex=int(env.get(ENV_WORKER_INDEX, 0)),
+        workerCount=int(env.get(ENV_WORKER_COUNT, 1)),
+        busPort=int(bus_port) if bus_port else None,
+        busPeers=_parsePeers(env.get(ENV_BUS_PEERS, "")),
+    )
+
+
+# Splits shards 0..shardCount-1 into contiguous, nearly equal ranges
+def splitShards(shardCount: int, processes: int) -> List[List[int]]:
+    processes = max(1, min(processes, shardCount))
+    size, extra = divmod(shardCount, processes)
+    ranges, start = [], 0
+    for n in range(processes):
+        end = start + size + (1 if n < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
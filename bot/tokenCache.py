@@ -0,0 +1,84 @@
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, Tuple
+import threading
+from ttlCache import TTLCache
+
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet
+
+# How long a looked-up token is trusted before asking the database again
+TOKEN_TTL = 120
+# Logged-out users are re-checked sooner so a fresh /login is noticed quickly
+LOGGED_OUT_TTL = 15
+
+
+class EncryptedTokenCache:
+    """
+    Caches (token, domain) pairs by Discord ID with the pair encrypted at rest
+    in memory, using a key generated per process. Users without a token are
+    cached as None for a shorter time. The cipher, and the cryptography
+    import behind it, is only set up on first use or by prepare().
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self._cache = TTLCache(maxsize=maxsize, ttl=TOKEN_TTL)
+        self._fernet: Optional["Fernet"] = None
+        self._fernet_lock = threading.Lock()
+
+    # Creates the cipher; safe to call from a worker thread to warm it up early
+    def prepare(self) -> "Fernet":
+        if self._fernet is None:
+            with self._fernet_lock:
+                if self._fernet is None:
+                    from cryptography.fernet import Fernet
+
+                    self._fernet = Fernet(Fernet.generate_key())
+        return self._fernet
+
+    def _encrypt(self, token_data: Tuple[str, str]) -> bytes:
+        token, domain = token_data
+        return self.prepare().encrypt(f"{token}\n{domain}".encode())
+
+    def _decrypt(self, blob: bytes) -> Tuple[str, str]:
+        token, domain = self.prepare().decrypt(blob).decode().split("\n", 1)
+        return token, domain
+
+    async def get(
+        self,
+        discordID: int,
+        loader: Callable[[], Awaitable[Optional[Tuple[str, str]]]],
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Return the user's (token, domain), calling `loader` on a miss.
+        Concurrent misses for the same user share one database query.
+        """
+
+        async def load() -> Optional[bytes]:
+            token_data = await loader()
+            return self._encrypt(token_data) if token_data else None
+
+        blob = await self._cache.getOrLoad(
+            discordID,
+            load,
+            ttl=lambda value: TOKEN_TTL if value else LOGGED_OUT_TTL,
+        )
+        return self._decrypt(blob) if blob else None
+
+    # Stores a pair already read from the database, e.g. by the cache warmup
+    def put(self, discordID: int, token_data: Tuple[str, str]):
+        self._cache.set(discordID, self._encrypt(token_data), TOKEN_TTL)
+
+    # Forgets a user immediately, e.g. after /logout
+    def evict(self, discordID: int):
+        self._cache.pop(discordID)
+
+    # Returns (hits, misses) for metrics
+    def stats(self) -> Tuple[int, int]:
+        return self._cache.stats()
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+import asyncio
+import time
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    An in-process cache with a per-entry time to live and LRU eviction once
+    `maxsize` entries are stored. Concurrent misses for the same key share a
+    single load through getOrLoad().
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not _MISSING
+
+    # Returns the stored value, or _MISSING if absent or expired
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    # Returns (hits, misses) for metrics
+    def stats(self) -> Tuple[int, int]:
+        return self.hits, self.misses
+
+    # Returns the keys of every entry that hasn't expired, oldest use first
+    def keys(self) -> List[Hashable]:
+        now = time.monotonic()
+        return [
+            key for key, (expires_at, _) in self._entries.items() if expires_at > now
+        ]
+
+    # Removes one key, including any load for it that is still running
+    def pop(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    # Removes every key for which `predicate(key)` is true
+    def invalidate(self, predicate: Callable[[Hashable], bool]):
+        for key in [k for k in self._entries if predicate(k)]:
+            del self._entries[key]
+        for key in [k for k in self._inflight if predicate(k)]:
+            del self._inflight[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._inflight.clear()
+
+    async def getOrLoad(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Union[float, Callable[[Any], float], None] = None,
+        shouldCache: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        Return the cached value for `key`, or await `loader()` to produce it.
+        Callers that miss while a load is already running wait for that load
+        instead of starting their own. Results for which `shouldCache` returns
+        False are handed back but not stored. `ttl` may be a function of the
+        loaded value, e.g. to keep negative results for less time.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        future = self._inflight.get(key)
+        while future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Only retry if the load was cancelled, not this caller
+                if not future.cancelled():
+                    raise
+            future = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Nobody else may be waiting, so mark the exception as retrieved
+                future.exception()
+            raise
+
+        # A key invalidated mid-load is returned to the caller but not stored
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+            if shouldCache is None or shouldCache(value):
+                self.set(key, value, ttl(value) if callable(ttl) else ttl)
+        future.set_result(value)
+        return value
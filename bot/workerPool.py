@@ -0,0 +1,141 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+import asyncio
+
+# "thread", "process" or "inline" (run on the event loop, e.g. when debugging)
+WORKER_KIND = "thread"
+MAX_WORKERS = 2
+
+# Jobs queued within BATCH_WINDOW seconds share one dispatch, up to BATCH_SIZE
+BATCH_SIZE = 32
+BATCH_WINDOW = 0.002
+
+# Payloads smaller than this are cheaper to handle inline than to dispatch
+INLINE_BYTES = 4096
+
+Job = Tuple[Callable, tuple]
+
+
+# Runs a batch of jobs in a worker, returning (ok, result or exception) per job
+def _runBatch(jobs: List[Job]) -> List[Tuple[bool, Any]]:
+    results = []
+    for func, args in jobs:
+        try:
+            results.append((True, func(*args)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+class WorkerStage:
+    """
+    Runs CPU-bound transforms (JSON decoding, date and HTML parsing) off the
+    event loop. Jobs submitted close together are sent to the executor as a
+    single batch, so many small payloads cost one dispatch. With a process
+    pool, functions and arguments must be picklable (module-level functions).
+    """
+
+    def __init__(
+        self,
+        kind: str = WORKER_KIND,
+        workers: int = MAX_WORKERS,
+        batchSize: int = BATCH_SIZE,
+        batchWindow: float = BATCH_WINDOW,
+    ):
+        self.kind = kind
+        self.batchSize = batchSize
+        self.batchWindow = batchWindow
+        self.jobs = 0
+        self.dispatches = 0
+        self._executor: Optional[Executor] = None
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        elif kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="parse"
+            )
+        self._batch: List[Tuple[Job, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def run(self, func: Callable, *args) -> Any:
+        self.jobs += 1
+        if self._executor is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append(((func, args), future))
+        if len(self._batch) >= self.batchSize:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batchWindow, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        self.dispatches += 1
+        loop = asyncio.get_running_loop()
+        dispatched = loop.run_in_executor(
+            self._executor, _runBatch, [job for job, _ in batch]
+        )
+        dispatched.add_done_callback(
+            lambda done: self._resolve([future for _, future in batch], done)
+        )
+
+    @staticmethod
+    def _resolve(futures: List[asyncio.Future], done: asyncio.Future):
+        if done.cancelled() or done.exception() is not None:
+            for future in futures:
+                if future.done():
+                    continue
+                if done.cancelled():
+                    future.cancel()
+                else:
+                    future.set_exception(done.exception())
+            return
+        for future, (ok, value) in zip(futures, done.result()):
+            if future.done():
+                continue  # The caller was cancelled while its batch ran
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_stage: Optional[WorkerStage] = None
+
+
+# Replaces the shared stage, e.g. to switch to a process pool at startup
+def configure(kind: str = WORKER_KIND, workers: int = MAX_WORKERS) -> WorkerStage:
+    global _stage
+    if _stage is not None:
+        _stage.shutdown()
+    _stage = WorkerStage(kind, workers)
+    return _stage
+
+
+def getStage() -> WorkerStage:
+    global _stage
+    if _stage is None:
+        _stage = WorkerStage()
+    return _stage
+
+
+# Runs `func(*args)` on the shared worker stage
+async def run(func: Callable, *args) -> Any:
+    return await getStage().run(func, *args)
+
+
+def shutdown():
+    global _stage
+    if _stage is not None:
+        _stage.shutdown()
+        _stage = None
@@ -1,12 +1,15 @@
+-- Creates the current schema from scratch. Existing databases are upgraded
+-- with the scripts in database/migrations (run `python migrations.py`).
+
 -- Drop and create the database
 DROP DATABASE IF EXISTS CanvasCord;
 CREATE DATABASE CanvasCord;
 USE CanvasCord;
 
--- Users table
+-- Users table, deleting a user cascades to their token, settings and reminders
 CREATE TABLE Users (
     UserID INT AUTO_INCREMENT PRIMARY KEY,
-    DiscordID VARCHAR(255) NOT NULL UNIQUE
+    DiscordID BIGINT UNSIGNED NOT NULL UNIQUE
 );
 
 -- Servers table
@@ -30,7 +33,11 @@ CREATE TABLE Canvas_Token (
     Domain VARCHAR(255) NOT NULL,
     Token VARCHAR(255) NOT NULL,
     ExpirationDate DATETIME,
-    FOREIGN KEY (UserID) REFERENCES Users(UserID)
+    CONSTRAINT fk_canvas_token_user FOREIGN KEY (UserID)
+        REFERENCES Users(UserID) ON DELETE CASCADE,
+    UNIQUE INDEX uq_canvas_token_user (UserID),
+    -- Covers the token lookup join without touching the table rows
+    INDEX idx_canvas_token_lookup (UserID, Domain, Token)
 );
 
 -- Configurations table
@@ -41,15 +48,77 @@ CREATE TABLE Configurations (
     GradePostings BOOLEAN DEFAULT TRUE,
     DueDates BOOLEAN DEFAULT TRUE,
     AnnouncementPostings BOOLEAN DEFAULT TRUE,
-    FOREIGN KEY (UserID) REFERENCES Users(UserID)
+    CONSTRAINT fk_configurations_user FOREIGN KEY (UserID)
+        REFERENCES Users(UserID) ON DELETE CASCADE,
+    UNIQUE INDEX uq_configurations_user (UserID)
 );
 
 -- Reminders table
 CREATE TABLE Reminders (
     ReminderID INT AUTO_INCREMENT PRIMARY KEY,
     UserID INT NOT NULL,
-    `When` VARCHAR(255) NOT NULL,
+    `When` DATETIME NOT NULL,
     Recurring ENUM('daily', 'weekly'),
     Content VARCHAR(255),
-    FOREIGN KEY (UserID) REFERENCES Users(UserID)
-);
\ No newline at end of file
+    CONSTRAINT fk_reminders_user FOREIGN KEY (UserID)
+        REFERENCES Users(UserID) ON DELETE CASCADE,
+    -- The reminder scheduler range-scans upcoming fire times
+    INDEX idx_reminders_when (`When`, ReminderID),
+    -- Covers a user's reminder listing
+    INDEX idx_reminders_user (UserID, `When`, Recurring, Content)
+);
+
+-- Watermarks table, high-water marks for the Canvas change poller (UTC)
+CREATE TABLE Watermarks (
+    WatermarkKey VARCHAR(255) PRIMARY KEY,
+    Mark DATETIME NOT NULL
+);
+
+-- Canvas_Cache table, stored Canvas API pages with their ETag/Last-Modified
+-- validators so they can be revalidated with conditional requests
+CREATE TABLE Canvas_Cache (
+    CacheKey CHAR(64) PRIMARY KEY,
+    ETag VARCHAR(255),
+    LastModified VARCHAR(64),
+    NextURL TEXT,
+    Body MEDIUMTEXT NOT NULL,
+    FetchedAt DATETIME NOT NULL
+);
+
+-- User_Activity table, decayed command counts used to preload caches
+CREATE TABLE User_Activity (
+    UserID INT PRIMARY KEY,
+    Score DOUBLE NOT NULL,
+    LastActive DATETIME NOT NULL,
+    -- Bot process that last served the user, in a sharded deployment
+    WorkerIndex SMALLINT NOT NULL DEFAULT 0,
+    CONSTRAINT fk_user_activity_user FOREIGN KEY (UserID)
+        REFERENCES Users(UserID) ON DELETE CASCADE,
+    INDEX idx_user_activity_recent (WorkerIndex, LastActive)
+);
+
+-- Course_Enrollments table, subscribers' courses as last fetched from Canvas.
+-- Each bot process refreshes its own users' rows and polls its own courses.
+CREATE TABLE Course_Enrollments (
+    UserID INT NOT NULL,
+    Domain VARCHAR(255) NOT NULL,
+    ClassID BIGINT NOT NULL,
+    ClassName VARCHAR(255) NOT NULL,
+    PRIMARY KEY (UserID, Domain, ClassID),
+    CONSTRAINT fk_course_enrollments_user FOREIGN KEY (UserID)
+        REFERENCES Users(UserID) ON DELETE CASCADE
+);
+
+-- Schema_Migrations table, versions from database/migrations already applied
+CREATE TABLE Schema_Migrations (
+    Version INT PRIMARY KEY,
+    Name VARCHAR(255) NOT NULL,
+    AppliedAt DATETIME NOT NULL
+);
+
+-- This file already includes every migration up to this version
+INSERT INTO Schema_Migrations (Version, Name, AppliedAt) VALUES
+    (1, '0001_typed_columns_and_indexes', UTC_TIMESTAMP()),
+    (2, '0002_cascade_user_deletes', UTC_TIMESTAMP()),
+    (3, '0003_user_activity', UTC_TIMESTAMP()),
+    (4, '0004_course_enrollments', UTC_TIMESTAMP());
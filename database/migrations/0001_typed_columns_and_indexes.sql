@@ -0,0 +1,40 @@
+-- Brings a database created from the original database.sql up to date.
+-- MySQL commits each DDL statement on its own, so back up before running.
+
+-- Discord IDs are 64-bit snowflakes, compare them as numbers
+ALTER TABLE Users MODIFY DiscordID BIGINT UNSIGNED NOT NULL;
+
+-- Reminder fire times become range-scannable and indexed
+ALTER TABLE Reminders MODIFY `When` DATETIME NOT NULL;
+ALTER TABLE Reminders
+    ADD INDEX idx_reminders_when (`When`, ReminderID),
+    ADD INDEX idx_reminders_user (UserID, `When`, Recurring, Content);
+
+-- Keep only the newest token per user, then make it unique
+DELETE older FROM Canvas_Token older
+JOIN Canvas_Token newer
+    ON older.UserID = newer.UserID AND older.TokenID < newer.TokenID;
+ALTER TABLE Canvas_Token
+    ADD UNIQUE INDEX uq_canvas_token_user (UserID),
+    ADD INDEX idx_canvas_token_lookup (UserID, Domain, Token);
+
+-- Keep only the newest settings per user so ON DUPLICATE KEY UPDATE works
+DELETE older FROM Configurations older
+JOIN Configurations newer
+    ON older.UserID = newer.UserID AND older.ConfigID < newer.ConfigID;
+ALTER TABLE Configurations ADD UNIQUE INDEX uq_configurations_user (UserID);
+
+-- Tables added for the notification poller and persistent Canvas cache
+CREATE TABLE IF NOT EXISTS Watermarks (
+    WatermarkKey VARCHAR(255) PRIMARY KEY,
+    Mark DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Canvas_Cache (
+    CacheKey CHAR(64) PRIMARY KEY,
+    ETag VARCHAR(255),
+    LastModified VARCHAR(64),
+    NextURL TEXT,
+    Body MEDIUMTEXT NOT NULL,
+    FetchedAt DATETIME NOT NULL
+);
@@ -0,0 +1,35 @@
+"""
+Recreates the foreign keys to Users with ON DELETE CASCADE, so deleting a
+user row also removes their token, settings and reminders in one statement.
+
+The original schema left these constraints unnamed, so their generated names
+are looked up instead of hard-coded.
+"""
+
+CHILD_TABLES = ("Canvas_Token", "Configurations", "Reminders")
+
+
+def upgrade(cursor):
+    for table in CHILD_TABLES:
+        cursor.execute(
+            """
+            SELECT rc.CONSTRAINT_NAME, rc.TABLE_NAME, rc.DELETE_RULE
+            FROM information_schema.REFERENTIAL_CONSTRAINTS rc
+            WHERE rc.CONSTRAINT_SCHEMA = DATABASE()
+              AND LOWER(rc.TABLE_NAME) = LOWER(%s)
+              AND LOWER(rc.REFERENCED_TABLE_NAME) = 'users'
+            """,
+            (table,),
+        )
+        constraints = cursor.fetchall()
+        if constraints and all(rule == "CASCADE" for _, _, rule in constraints):
+            continue
+        for name, actual_table, _ in constraints:
+            cursor.execute(f"ALTER TABLE `{actual_table}` DROP FOREIGN KEY `{name}`")
+        cursor.execute(
+            f"""
+            ALTER TABLE {table}
+                ADD CONSTRAINT fk_{table.lower()}_user
+                FOREIGN KEY (UserID) REFERENCES Users(UserID) ON DELETE CASCADE
+            """
+        )
@@ -0,0 +1,10 @@
+-- Decayed per-user command activity, ranks users for cache preloading
+CREATE TABLE IF NOT EXISTS User_Activity (
+    UserID INT PRIMARY KEY,
+    Score DOUBLE NOT NULL,
+    LastActive DATETIME NOT NULL,
+    WorkerIndex SMALLINT NOT NULL DEFAULT 0,
+    CONSTRAINT fk_user_activity_user FOREIGN KEY (UserID)
+        REFERENCES Users(UserID) ON DELETE CASCADE,
+    INDEX idx_user_activity_recent (WorkerIndex, LastActive)
+);
@@ -0,0 +1,11 @@
+-- Course enrollments of notification subscribers, shared by the bot processes
+-- so each user's class list is fetched from Canvas by one process only
+CREATE TABLE IF NOT EXISTS Course_Enrollments (
+    UserID INT NOT NULL,
+    Domain VARCHAR(255) NOT NULL,
+    ClassID BIGINT NOT NULL,
+    ClassName VARCHAR(255) NOT NULL,
+    PRIMARY KEY (UserID, Domain, ClassID),
+    CONSTRAINT fk_course_enrollments_user FOREIGN KEY (UserID)
+        REFERENCES Users(UserID) ON DELETE CASCADE
+);
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The bot modules import each other by name, as when run from bot/
+BOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bot")
+sys.path.insert(0, BOT_DIR)
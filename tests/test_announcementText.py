@@ -0,0 +1,20 @@
+from announcementText import renderHTML
+
+
+def test_short_text_is_unchanged():
+    assert renderHTML("<p>abcde</p>", 5) == "abcde"
+
+
+def test_long_text_is_cut_with_an_ellipsis():
+    assert renderHTML("abcdef", 5) == "abcd…"
+
+
+def test_text_that_exactly_fills_the_limit_stops_collecting():
+    assert renderHTML("abcdefghij<b>more text here that is long</b>", 10) == (
+        "abcdefghij"
+    )
+
+
+def test_exact_fill_at_the_default_limit_stays_within_it():
+    html = "x" * 1024 + "<b>" + "y" * 2000 + "</b>"
+    assert len(renderHTML(html)) == 1024